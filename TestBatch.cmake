@@ -0,0 +1,52 @@
+# batch compilation of modules importing each other, with incremental builds
+set(ENV{FINC_CACHE_DIR} ${WORK}/cache)
+file(REMOVE_RECURSE ${WORK})
+
+file(WRITE ${WORK}/src/lib.fin "def value() Int\n    1\n")
+file(WRITE ${WORK}/src/main.fin "import lib\n\ndef main()\n    lib:value()\n")
+file(WRITE ${WORK}/src/app.fin
+    "import rt\n\ndef main()\n    rt:assert(1 + 1 == 2)\n")
+
+macro(compile_batch)
+    execute_process(COMMAND ${COMPILER} ${WORK}/src -i --out-dir ${WORK}/out
+        RESULT_VARIABLE res ERROR_VARIABLE err)
+endmacro()
+
+compile_batch()
+if(res OR NOT err MATCHES "0 hits, 3 misses")
+    message(FATAL_ERROR "Batch compilation failed: ${err}")
+endif()
+
+foreach(mod lib main app)
+    if(NOT EXISTS ${WORK}/out/${mod}.fm)
+        message(FATAL_ERROR "Module ${mod} not written")
+    endif()
+endforeach()
+
+# the runtime cannot load imported libraries yet, so only a module without
+# imports is run
+execute_process(COMMAND ${FIN} ${WORK}/out/app.fm RESULT_VARIABLE res)
+if(res)
+    message(FATAL_ERROR "Execution failed")
+endif()
+
+compile_batch()
+if(res OR NOT err MATCHES "3 hits, 0 misses")
+    message(FATAL_ERROR "Unchanged modules not reused: ${err}")
+endif()
+
+# changing a signature must invalidate the cached outputs of dependents
+file(WRITE ${WORK}/src/lib.fin "def value(n Int) Int\n    n\n")
+
+compile_batch()
+if(NOT res OR NOT err MATCHES "main.fin: .*no viable function overload")
+    message(FATAL_ERROR "Dependent of changed module not recompiled: ${err}")
+endif()
+
+# only the edited module is compiled again
+file(WRITE ${WORK}/src/main.fin "import lib\n\ndef main()\n    lib:value(1)\n")
+
+compile_batch()
+if(res OR NOT err MATCHES "2 hits, 1 misses")
+    message(FATAL_ERROR "Batch recompilation failed: ${err}")
+endif()
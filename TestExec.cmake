@@ -1,9 +1,10 @@
-execute_process(COMMAND ${COMPILER} ${INPUT} -o test.fm RESULT_VARIABLE res)
+execute_process(COMMAND ${COMPILER} ${INPUT} ${FLAGS} -o ${OUTPUT}
+    RESULT_VARIABLE res)
 if(res)
     message(FATAL_ERROR "Compilation failed")
 endif()
 
-execute_process(COMMAND ${FIN} test.fm RESULT_VARIABLE res)
+execute_process(COMMAND ${FIN} ${OUTPUT} RESULT_VARIABLE res)
 if(res)
     message(FATAL_ERROR "Execution failed")
 endif()
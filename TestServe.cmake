@@ -0,0 +1,26 @@
+# two requests to a compile server, the first one failing
+file(REMOVE_RECURSE ${WORK})
+file(WRITE ${WORK}/requests.jsonl
+    "{\"id\": 1, \"source\": \"def main()\\n    missing\\n\"}\n"
+    "{\"id\": 2, \"src\": \"${INPUT}\", \"out\": \"${WORK}/test.fm\"}\n")
+
+execute_process(COMMAND ${COMPILER} --serve
+    INPUT_FILE ${WORK}/requests.jsonl
+    RESULT_VARIABLE res OUTPUT_VARIABLE out)
+if(res)
+    message(FATAL_ERROR "Server failed")
+endif()
+
+set(failed "\"ok\": false, \"error\": \"AnalyzerError: cannot find symbol")
+if(NOT out MATCHES "${failed} 'missing'[^\n]*\"id\": 1}")
+    message(FATAL_ERROR "Failing request not reported: ${out}")
+endif()
+
+if(NOT out MATCHES "\"ok\": true, [^\n]*\"id\": 2}")
+    message(FATAL_ERROR "Request after failure not served: ${out}")
+endif()
+
+execute_process(COMMAND ${FIN} ${WORK}/test.fm RESULT_VARIABLE res)
+if(res)
+    message(FATAL_ERROR "Execution failed")
+endif()
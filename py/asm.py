@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 
-from typing import List, Iterable, Dict, Any, DefaultDict, Iterator
+from typing import List, Iterable, Dict, Any, DefaultDict, Iterator, Tuple
 from collections import defaultdict
 import io
 import argparse
+import bisect
+import functools
 import struct
 import instrs
 from finc import builtin  # FIXME: circular import workaround
@@ -13,7 +15,8 @@ from finc import tokens
 from finc import instr
 
 
-BRANCH_SIZE = 4
+# instructions declaring functions, types and members
+DECLARATIONS = {'lib', 'fn', 'type', 'member', 'ref_lib', 'ref_fn', 'ref_type'}
 
 
 class RefTable:
@@ -27,87 +30,17 @@ class RefTable:
         self.refs[value] = len(self.refs)
 
 
-class Chunk:
-    def resolve(self,
-                loc: int,
-                syms: Dict[str, int],
-                refs: Dict[str, RefTable]) -> int:
-        raise NotImplementedError()
-
-    def write(self, out: io.BytesIO, syms: Dict[str, int]) -> None:
-        raise NotImplementedError()
-
-
-class Bytes(Chunk):
-    def __init__(self, val: bytes) -> None:
-        self.value = val
-
-    def resolve(self,
-                loc: int,
-                syms: Dict[str, int],
-                refs: Dict[str, RefTable]) -> int:
-        return len(self.value)
-
-    def write(self, out: io.BytesIO, syms: Dict[str, int]) -> None:
-        out.write(self.value)
-
-
-class Label(Chunk):
-    def __init__(self, label: str) -> None:
-        self.label = label
-
-    def resolve(self,
-                loc: int,
-                syms: Dict[str, int],
-                refs: Dict[str, RefTable]) -> int:
-        syms[self.label] = loc
-        return 0
-
-    def write(self, out: io.BytesIO, syms: Dict[str, int]) -> None:
-        pass
-
-
-class Branch(Chunk):
-    def __init__(self, label: str) -> None:
-        self.label = label
-
-        self.location: int = None
-
-    def resolve(self,
-                loc: int,
-                syms: Dict[str, int],
-                refs: Dict[str, RefTable]) -> int:
-        self.location = loc
-        return BRANCH_SIZE
-
-    def write(self, out: io.BytesIO, syms: Dict[str, int]) -> None:
-        value = syms[self.label] - (self.location + BRANCH_SIZE)
-        out.write(encode(value, BRANCH_SIZE))
-
-
-class Reference(Chunk):
-    def __init__(self, tp: str, ref: str) -> None:
-        self.type = tp
-        self.ref = ref
-
-        self.value: bytes = None
-
-    def resolve(self,
-                loc: int,
-                syms: Dict[str, int],
-                refs: Dict[str, RefTable]) -> int:
-        self.value = encode(refs[self.type][self.ref])
-        return len(self.value)
-
-    def write(self, out: io.BytesIO, syms: Dict[str, int]) -> None:
-        out.write(self.value)
-
-
 class Assembler:
     def __init__(self) -> None:
         self.instrs = {ins.opname: ins for ins in instrs.load()}
 
-        self.chunks: List[Chunk] = None
+        # output without branch targets, with the locations of labels, and
+        # of the branch targets to be inserted once all labels are known
+        self.out: bytearray = None
+        self.labels: Dict[str, int] = None
+        self.fixups: List[Tuple[int, str]] = None
+        self.fixup_locations: List[int] = None
+
         self.references: DefaultDict[str, RefTable] = None
         self.functions: RefTable = None
         self.types: RefTable = None
@@ -120,49 +53,83 @@ class Assembler:
     def assemble(self,
                  src: Iterable[instr.Instr],
                  out: io.BytesIO) -> None:
-        self.chunks = []
+        self.out = bytearray(b'#!/usr/bin/env fin\n')  # shebang
+        self.labels = {}
+        self.fixups = []
+
         self.references = defaultdict(RefTable)
         self.functions = RefTable()
         self.types = RefTable()
         self.members = RefTable()
 
-        # shebang
-        self.chunks.append(Bytes(b'#!/usr/bin/env fin\n'))
+        # functions, types and members can be referred to before they are
+        # defined, so they are all declared first
+        src = list(src)
+        for ins in src:
+            self.declare(ins)
 
         for ins in src:
             self.write(ins)
 
-        syms: Dict[str, int] = {}
-        location = 0
+        self.fixup_locations = [loc for loc, _ in self.fixups]
 
-        self.references['function'] = self.functions
-        self.references['type'] = self.types
-        self.references['member'] = self.members
+        sizes = self.relax()
+        shifts = prefix_sums(sizes)
 
-        # two-pass to resolve labels and references
-        for chunk in self.chunks:
-            size = chunk.resolve(location, syms, self.references)
-            location += size
+        # insert the branch targets
+        res = bytearray()
+        prev = 0
+        for i, (loc, label) in enumerate(self.fixups):
+            res += self.out[prev:loc]
 
-        for chunk in self.chunks:
-            chunk.write(out, syms)
+            value = self.location(label, shifts) - (loc + shifts[i + 1])
+            res += encode(value, sizes[i])
+            prev = loc
 
-    def write(self, instruction: instr.Instr) -> None:
-        if len(instruction.tokens) == 0:
-            return
+        res += self.out[prev:]
+        out.write(res)
+
+    def relax(self) -> List[int]:
+        # branch targets start with the shortest encoding, and are lengthened
+        # until their offsets fit; offsets depend on the sizes of the targets
+        # in between, so this is repeated until no size changes, which always
+        # happens since sizes only grow
+        sizes = [1] * len(self.fixups)
+
+        changed = True
+        while changed:
+            changed = False
+            shifts = prefix_sums(sizes)
+
+            for i, (loc, label) in enumerate(self.fixups):
+                value = self.location(label, shifts) - (loc + shifts[i + 1])
+                size = len(encode(value))
+                if size > sizes[i]:
+                    sizes[i] = size
+                    changed = True
+
+        return sizes
 
-        opname = instruction.tokens[0]
-        args = instruction.tokens[1:]
+    def location(self, label: str, shifts: List[int]) -> int:
+        # branch targets at the location of the label come before it
+        loc = self.labels[label]
+        return loc + shifts[bisect.bisect_right(self.fixup_locations, loc)]
+
+    def parse(self, instruction: instr.Instr) -> instr.Instr:
+        # turns an instruction read from text into one with typed operands
+        opname = instruction.opname
+        args = instruction.args
+
+        if opname == instr.SPACE:
+            return instruction
 
         # comment
         if opname[0] == '#':
-            return
+            return instr.Instr(instr.COMMENT, ('{}', opname[1:].strip()))
 
         # pseudo-label resolution
         if opname[0] == '!':
-            tp = opname[1:]
-            self.references[tp].add(args[0])
-            return
+            return instruction
 
         # label
         if opname[-1] == ':':
@@ -171,8 +138,40 @@ class Assembler:
                     'labels need to be on their own lines',
                     instruction)
 
-            self.chunks.append(Label(opname[:-1]))
-            return
+            return instr.Instr(instr.LABEL, (opname[:-1],))
+
+        ins = self._lookup(instruction)
+
+        typed: List[Any] = []
+        for param, arg in zip(ins.params, args):
+            val: Any = arg
+            if param.type == 'int' or param.type == 'i':
+                val = int(arg, 0)
+
+            elif param.type == 'f':
+                val = float(arg)
+
+            elif param.type == 'str':
+                if arg[0] != "'" or arg[-1] != "'":
+                    raise error.AssemblerError(
+                        'expected quotes around string',
+                        instruction)
+
+                val = instr.String(get_name(arg))
+
+            elif param.type == 'tar':
+                if not arg[0].isalpha():
+                    raise error.AssemblerError(
+                        'branch target not a label',
+                        instruction)
+
+            typed.append(val)
+
+        return instr.Instr(opname, typed, instruction.indent)
+
+    def _lookup(self, instruction: instr.Instr) -> instrs.Instr:
+        opname = instruction.opname
+        args = instruction.args
 
         if opname not in self.instrs:
             raise error.AssemblerError(
@@ -180,7 +179,6 @@ class Assembler:
                 instruction)
 
         ins = self.instrs[opname]
-        self.chunks.append(Bytes(pack('B', ins.opcode)))
 
         if len(args) != len(ins.params):
             raise error.AssemblerError(
@@ -189,74 +187,105 @@ class Assembler:
                 f'\n  expected {len(ins.params)}, got {len(args)}',
                 instruction)
 
-        if len(args) > 0:
-            name = get_name(args[0])
+        return ins
 
-            if opname == 'ref_lib':
-                self.ref_lib = name
+    def declare(self, instruction: instr.Instr) -> None:
+        opname = instruction.opname
+        if opname not in DECLARATIONS:
+            return
 
-            elif opname == 'ref_fn':
-                self.functions.add(f'{self.ref_lib}:{name}')
+        name = instruction.args[0]
 
-            elif opname == 'ref_type':
-                self.types.add(f'{self.ref_lib}:{name}')
+        if opname == 'ref_lib':
+            self.ref_lib = name
 
-            elif opname == 'lib':
-                self.lib = name
+        elif opname == 'ref_fn':
+            self.functions.add(f'{self.ref_lib}:{name}')
 
-            elif opname == 'fn':
-                self.functions.add(f'{self.lib}:{name}')
-                self.references.clear()
+        elif opname == 'ref_type':
+            self.types.add(f'{self.ref_lib}:{name}')
 
-            elif opname == 'type':
-                self.type = f'{self.lib}:{name}'
-                self.types.add(self.type)
-                self.references.clear()
+        elif opname == 'lib':
+            self.lib = name
 
-            elif opname == 'member':
-                self.members.add(f'{self.type}:{name}')
+        elif opname == 'fn':
+            self.functions.add(f'{self.lib}:{name}')
 
-        for param, arg in zip(ins.params, args):
-            chunk: Chunk
-            if param.type == 'int':
-                chunk = Bytes(encode(int(arg, 0)))
+        elif opname == 'type':
+            self.type = f'{self.lib}:{name}'
+            self.types.add(self.type)
 
-            elif param.type == 'str':
-                if arg[0] != "'" or arg[-1] != "'":
-                    raise error.AssemblerError(
-                        'expected quotes around string',
-                        instruction)
+        elif opname == 'member':
+            self.members.add(f'{self.type}:{name}')
 
-                val = get_name(arg)
-                chunk = Bytes(encode(len(val)) + val.encode())
+    def write(self, instruction: instr.Instr) -> None:
+        opname = instruction.opname
+        args = instruction.args
 
-            elif param.type == 'fn':
-                chunk = Reference('function', arg)
+        if opname == instr.SPACE or opname == instr.COMMENT:
+            return
 
-            elif param.type == 'tp':
-                chunk = Reference('type', arg)
+        if opname == instr.LABEL:
+            self.labels[args[0]] = len(self.out)
+            return
 
-            elif param.type == 'mem':
-                chunk = Reference('member', arg)
+        # pseudo-label resolution
+        if opname[0] == '!':
+            tp = opname[1:]
+            self.references[tp].add(args[0])
+            return
 
-            elif param.type in ['sz', 'ctr', 'off']:
-                chunk = Bytes(encode(self.references[param.type][arg]))
+        ins = self._lookup(instruction)
+        out = self.out
+        out.append(ins.opcode)
 
-            elif param.type == 'i':
-                chunk = Bytes(pack('i', int(arg, 0)))
+        # sizes, offsets and contracts are local to functions and types
+        if opname == 'fn' or opname == 'type':
+            self.references.clear()
 
-            elif param.type == 'f':
-                chunk = Bytes(pack('f', float(arg)))
+        try:
+            for param, arg in zip(ins.params, args):
+                if param.type == 'int':
+                    out += encode(arg)
 
-            elif param.type == 'tar':
-                if not arg[0].isalpha():
-                    raise error.AssemblerError(
-                        'branch target not a label',
-                        instruction)
+                elif param.type == 'str':
+                    out += encode(len(arg))
+                    out += arg.encode()
+
+                elif param.type == 'fn':
+                    out += encode(self.functions[arg])
+
+                elif param.type == 'tp':
+                    out += encode(self.types[arg])
+
+                elif param.type == 'mem':
+                    out += encode(self.members[arg])
+
+                elif param.type in ['sz', 'ctr', 'off']:
+                    out += encode(self.references[param.type][arg])
+
+                elif param.type == 'i':
+                    out += pack('i', arg)
 
-                chunk = Branch(arg)
+                elif param.type == 'f':
+                    out += pack('f', arg)
 
-            self.chunks.append(chunk)
+                elif param.type == 'tar':
+                    # inserted once the label is known
+                    self.fixups.append((len(out), arg))
+        except KeyError as e:
+            # references to functions, types and members of other modules
+            # must be declared by the module
+            raise error.AssemblerError(f'undefined reference {e}',
+                                       instruction)
+
+
+def prefix_sums(vals: List[int]) -> List[int]:
+    sums = [0]
+    for val in vals:
+        sums.append(sums[-1] + val)
+
+    return sums
 
 
 def pack(fmt: str, val: Any) -> bytes:
@@ -264,6 +293,17 @@ def pack(fmt: str, val: Any) -> bytes:
 
 
 def encode(val: int, size: int = None) -> bytes:
+    # operands are mostly small indices and sizes, and repeat a lot
+    if size is None:
+        if 0 <= val < SMALL_VALUES:
+            return _small[val]
+
+        return _encode_cached(val)
+
+    return _encode(val, size)
+
+
+def _encode(val: int, size: int = None) -> bytes:
     enc: List[int] = []
 
     if val < 0:
@@ -290,6 +330,13 @@ def encode(val: int, size: int = None) -> bytes:
     return bytes(reversed(enc))
 
 
+_encode_cached = functools.lru_cache(maxsize=4096)(_encode)
+
+# encodings of the values below SMALL_VALUES, which cover most operands
+SMALL_VALUES = 1 << 10
+_small = [_encode(val) for val in range(SMALL_VALUES)]
+
+
 def get_name(val: str) -> str:
     return val[1:-1]
 
@@ -306,8 +353,12 @@ def lex(src: Iterable[str]) -> Iterator[instr.Instr]:
         if token.type == 'EOL':
             # TODO: line number & source
             # TODO: indent?
-            yield instr.Instr([t.value for t in segs],
-                              indent=0)
+            if len(segs) == 0:
+                yield instr.Instr(instr.SPACE)
+            else:
+                yield instr.Instr(segs[0].value,
+                                  [t.value for t in segs[1:]])
+
             segs = []
         else:
             segs.append(token)
@@ -324,7 +375,7 @@ def main() -> None:
 
     asm = Assembler()
     tks = lex(args.src)
-    asm.assemble(tks, args.out)
+    asm.assemble((asm.parse(ins) for ins in tks), args.out)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,130 @@
+from typing import Any, Dict, List
+import argparse
+import io
+import json
+from finc import stats
+import compiler
+from . import programs
+
+
+def run(comp: compiler.Compiler, src: str, repeat: int) -> Dict[str, Any]:
+    # best of several runs, per pass
+    best: Dict[str, float] = {}
+    counters: Dict[str, int] = {}
+
+    for _ in range(repeat):
+        comp.compile(io.StringIO(src), io.BytesIO(), 'main', 'exec')
+
+        for pas in comp.stats.passes:
+            best[pas.name] = min(best.get(pas.name, pas.time), pas.time)
+            counters.update(pas.counters)
+
+    total = sum(best.values())
+    return {
+        'passes': best,
+        'counters': counters,
+        'time': total,
+        'tokens/s': counters['tokens'] / best['lex'],
+        'nodes/s': counters['nodes'] / best['parse'],
+        'bytes/s': counters['bytes'] / total,
+    }
+
+
+RATES = ['tokens/s', 'nodes/s', 'bytes/s']
+
+
+def report(results: Dict[str, Dict[str, Any]],
+           baseline: Dict[str, Dict[str, Any]]) -> List[str]:
+    lines = [f'{"shape":<14}{"time (ms)":>12}' +
+             ''.join(f'{rate:>14}' for rate in RATES)]
+
+    for shape, res in results.items():
+        lines.append(f'{shape:<14}{res["time"] * 1000:>12.2f}' +
+                     ''.join(f'{res[rate]:>14.0f}' for rate in RATES))
+
+        if shape in baseline:
+            base = baseline[shape]
+            changes = [res[rate] / base[rate] - 1 for rate in RATES]
+            time = res['time'] / base['time'] - 1
+            lines.append(f'{"  vs baseline":<14}{time:>+12.1%}' +
+                         ''.join(f'{c:>+14.1%}' for c in changes))
+
+    return lines
+
+
+def report_passes(results: Dict[str, Dict[str, Any]],
+                  baseline: Dict[str, Dict[str, Any]]) -> List[str]:
+    lines = [f'{"shape":<14}{"pass":<10}{"time (ms)":>12}{"vs baseline":>14}']
+
+    for shape, res in results.items():
+        for name, time in res['passes'].items():
+            line = f'{shape:<14}{name:<10}{time * 1000:>12.2f}'
+
+            base = baseline.get(shape, {}).get('passes', {})
+            if name in base:
+                line += f'{time / base[name] - 1:>+14.1%}'
+
+            lines.append(line)
+
+    return lines
+
+
+def main() -> None:
+    ag = argparse.ArgumentParser(description='Fin compiler benchmarks.')
+    ag.add_argument('shapes', metavar='shape', nargs='*',
+                    help='program shapes to benchmark, out of ' +
+                    ', '.join(programs.names()) + ' (default: all)')
+    ag.add_argument('-n', '--size', dest='size', metavar='<n>', type=int,
+                    default=200,
+                    help='size of the generated programs')
+    ag.add_argument('-r', '--repeat', dest='repeat', metavar='<n>', type=int,
+                    default=5,
+                    help='number of runs, the fastest one is reported')
+    ag.add_argument('-b', '--baseline', dest='baseline', metavar='<file>',
+                    help='compare against results saved in <file>')
+    ag.add_argument('-s', '--save', dest='save', metavar='<file>',
+                    help='save results as JSON to <file>')
+    ag.add_argument('-p', '--passes', dest='passes', action='store_true',
+                    help='also report the time of every compiler pass')
+    ag.add_argument('--dump', dest='dump', metavar='<dir>',
+                    help='write the generated programs to <dir>')
+    args = ag.parse_args()
+
+    shapes = args.shapes or programs.names()
+    for shape in shapes:
+        if shape not in programs.SHAPES:
+            ag.error(f'unknown shape {shape}')
+
+    comp = compiler.Compiler()
+    comp.stats = stats.Stats(memory=False)
+
+    baseline: Dict[str, Dict[str, Any]] = {}
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for shape in shapes:
+        src = programs.SHAPES[shape](args.size)
+
+        if args.dump is not None:
+            with open(f'{args.dump}/{shape}.fin', 'w') as f:
+                f.write(src)
+
+        results[shape] = run(comp, src, args.repeat)
+
+    for line in report(results, baseline):
+        print(line)
+
+    if args.passes:
+        print()
+        for line in report_passes(results, baseline):
+            print(line)
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+from typing import Callable, Dict, List
+import argparse
+import random
+import timeit
+import asm
+
+
+def operands(n: int) -> List[int]:
+    # mostly small indices and sizes, with a tail of larger values, like the
+    # operands of generated modules
+    rng = random.Random(0)
+    return [rng.randrange(64) if rng.random() < 0.9 else rng.randrange(1 << 16)
+            for _ in range(n)]
+
+
+def main() -> None:
+    ag = argparse.ArgumentParser(description='Varint encoder benchmark.')
+    ag.add_argument('-n', '--size', dest='size', metavar='<n>', type=int,
+                    default=100000,
+                    help='number of values to encode')
+    ag.add_argument('-r', '--repeat', dest='repeat', metavar='<n>', type=int,
+                    default=5,
+                    help='number of runs, the fastest one is reported')
+    args = ag.parse_args()
+
+    vals = operands(args.size)
+
+    encoders: Dict[str, Callable[[], bytes]] = {
+        'uncached': lambda: b''.join([asm._encode(v) for v in vals]),
+        'encode': lambda: b''.join([asm.encode(v) for v in vals]),
+    }
+
+    expected = encoders['uncached']()
+
+    print(f'{"encoder":<14}{"time (ms)":>12}{"values/s":>14}')
+    for name, enc in encoders.items():
+        assert enc() == expected, f'{name} differs'
+
+        best = min(timeit.repeat(enc, number=1, repeat=args.repeat))
+        print(f'{name:<14}{best * 1000:>12.2f}{len(vals) / best:>14.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+from typing import Callable, Dict, List
+
+
+# each shape generates a program whose size grows linearly with `n`
+
+
+def functions(n: int) -> str:
+    lines = ['import rt', '']
+    for i in range(n):
+        lines += [
+            f'def fn{i}(a Int, b Int) Int',
+            f'    let c = a * b + {i}',
+            f'    c - a / 2',
+            '',
+        ]
+
+    lines += ['def main()', '    let total = 0']
+    for i in range(n):
+        lines.append(f'    total += fn{i}({i}, 2)')
+
+    lines.append('    rt:print(total)')
+    return '\n'.join(lines) + '\n'
+
+
+def nested(n: int) -> str:
+    lines = ['import rt', '', 'def main()', '    let x = 0']
+
+    # nesting depth is limited to keep recursion in the compiler in check
+    depth = 32
+    for block in range(max(n // depth, 1)):
+        indent = 1
+        for d in range(depth):
+            ind = '    ' * indent
+            lines += [
+                f'{ind}if x < {block * depth + d + 1} then',
+                f'{ind}    x += 1',
+            ]
+            indent += 1
+
+        lines.append('')
+
+    lines.append('    rt:print(x)')
+    return '\n'.join(lines) + '\n'
+
+
+def overloads(n: int) -> str:
+    lines = ['import rt', '']
+    for i in range(n):
+        lines += [
+            f'struct S{i}',
+            '    value Int',
+            '',
+            f'def over(s S{i}) Int',
+            f'    s.value + {i}',
+            '',
+            f'def over(s S{i}, t Int) Int',
+            f'    s.value * t',
+            '',
+        ]
+
+    lines += ['def main()', '    let total = 0']
+    for i in range(n):
+        lines += [
+            f'    total += over(S{i}({i}))',
+            f'    total += over(S{i}({i}), 2)',
+        ]
+
+    lines.append('    rt:print(total)')
+    return '\n'.join(lines) + '\n'
+
+
+def generics(n: int) -> str:
+    lines = [
+        'import rt',
+        '',
+        'struct Box{T}',
+        '    value T',
+        '',
+        'def wrap{T}(value T) Box{T}',
+        '    Box(value)',
+        '',
+        'def unwrap{T}(box Box{T}) T',
+        '    box.value',
+        '',
+        'def main()',
+    ]
+
+    # nest boxes to get distinct instantiations
+    tps = ['Int', 'Float', 'Bool']
+    vals = ['1', '1.5', 'TRUE']
+    for i in range(n):
+        val = vals[i % 3]
+        for _ in range(i % 5):
+            val = f'wrap({val})'
+
+        lines.append(f'    let v{i} = unwrap(wrap({val}))')
+
+    lines.append(f'    let b Box{{{tps[0]}}} = wrap(1)')
+    lines.append('    rt:print(b.value)')
+    return '\n'.join(lines) + '\n'
+
+
+def match(n: int) -> str:
+    lines = [
+        'import rt',
+        '',
+        'def classify(n Int) Int',
+        '    match n',
+    ]
+    for i in range(n):
+        lines.append(f'        {i} => {i * 2}')
+
+    lines += [
+        '        _ => 0',
+        '',
+        'def main()',
+        '    rt:print(classify(3))',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def loop(n: int) -> str:
+    lines = [
+        'import rt',
+        '',
+        'def main()',
+        '    let i = 0',
+        '    let x = 0',
+        '    while i < 10 do',
+    ]
+    for i in range(n):
+        lines.append(f'        x += i * {i} - x / {i + 1}')
+
+    lines += [
+        '        i += 1',
+        '',
+        '    rt:print(x)',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def expressions(n: int) -> str:
+    lines = ['import rt', '', 'def main()', '    let x = 1', '    let y = 2.5']
+    for i in range(n):
+        lines += [
+            f'    x = (x + {i}) * 3 - x / 2 % 7',
+            f'    y = y * 1.5 - y / {i + 1}.0',
+            f'    if x < {i} and not y > 2.0 or x == {i} then',
+            f'        x += 1',
+            '',
+        ]
+
+    lines.append('    rt:print(x)')
+    return '\n'.join(lines) + '\n'
+
+
+SHAPES: Dict[str, Callable[[int], str]] = {
+    'functions': functions,
+    'nested': nested,
+    'overloads': overloads,
+    'generics': generics,
+    'match': match,
+    'while': loop,
+    'expressions': expressions,
+}
+
+
+def names() -> List[str]:
+    return list(SHAPES)
@@ -1,119 +1,702 @@
 #!/usr/bin/env python3
 
-from typing import Iterable
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from collections import Counter
+from concurrent import futures
+from pathlib import Path
 import argparse
+import hashlib
+import contextlib
 import io
+import itertools
+import json
 import os
 import sys
+import traceback
 from finc import builtin
+from finc import ast
+from finc import cache
 from finc import symbols
 from finc import error
 from finc import generator
 from finc import lexer
 from finc import parser
 from finc import analyzer
+from finc import instr
+from finc import optimizer
+from finc import interface
+from finc import stats
 import asm
 
 
+REF_PATH = Path(__file__).resolve().parent / 'ref'
+
+NON_INSTRS = {instr.SPACE, instr.COMMENT, instr.LABEL}
+
+STAGES = ['lex', 'parse', 'ast', 'asm', 'exec']
+
+
+def fingerprint() -> str:
+    # everything that goes into the compiler itself, so that cached outputs
+    # are never reused across compiler changes
+    root = Path(__file__).resolve().parent
+    sources = [root / 'instructions']
+    sources += sorted(root.glob('*.py'))
+    sources += sorted((root / 'finc').glob('*.py'))
+    sources += sorted((root / 'lex').glob('*.lex'))
+
+    h = hashlib.sha256()
+    for source in sources:
+        h.update(cache.digest(source).encode())
+
+    return h.hexdigest()
+
+
+def imports(tree: ast.File) -> List[str]:
+    # top-level modules referenced by the import declarations
+    names = []
+    for decl in tree:
+        if isinstance(decl, ast.Import):
+            path = decl.path
+            while path.path is not None:
+                path = path.path
+
+            names.append(path.name)
+
+    return names
+
+
+def count_nodes(node: ast.Node) -> int:
+    return 1 + sum(count_nodes(c) for c in node.children() if c is not None)
+
+
+def count_instrs(instrs: Iterable[instr.Instr]) -> int:
+    # labels, comments, blank lines and pseudo-instructions are not emitted
+    return sum(1 for ins in instrs
+               if ins.opname not in NON_INSTRS and ins.opname[0] != '!')
+
+
 class Compiler:
-    def __init__(self) -> None:
+    def __init__(self,
+                 paths: List[Path] = None,
+                 cache_limit: int = None,
+                 jobs: int = None,
+                 optimize: bool = False) -> None:
+        # directories searched for imported modules
+        self.paths = [REF_PATH] + (paths or [])
+
+        # worker processes analyzing function bodies in parallel
+        self.jobs = jobs
+
+        # peephole optimization of the generated instructions
+        self.optimizer: Optional[optimizer.Optimizer] = None
+        if optimize:
+            self.optimizer = optimizer.Optimizer()
+
+        # per-pass statistics, only collected when enabled
+        self.stats = stats.Stats(enabled=False)
+
+        # reuse outputs of unchanged modules when given a cache size
+        self.build_cache: Optional[cache.BuildCache] = None
+        self.fingerprint: Optional[str] = None
+        if cache_limit is not None and cache.enabled():
+            self.build_cache = cache.BuildCache(cache_limit)
+
         self.lexer = lexer.Lexer('fin')
         self.parser = parser.Parser()
         self.assembler = asm.Assembler()
         self.generator = generator.Generator()
 
-        builtins = builtin.load_builtins()
-        self.root = symbols.Module('', None, builtins)
+        self.builtins = builtin.load_builtins()
+
+        # reference modules loaded so far, shared between compilations
+        self.modules: Dict[str, symbols.Module] = {}
+
+        self.reset()
+
+    def reset(self) -> None:
+        # each compilation gets its own root, so that a failed compilation
+        # cannot leave anything behind for the next one
+        self.root = symbols.Module('', None, self.builtins)
+
+        # lookups are counted per compilation
+        symbols.lookups.clear()
+
+        symbols.clear_candidates(self.builtins)
+        for mod in self.modules.values():
+            symbols.clear_candidates(mod)
 
         self.analyzeImport = analyzer.AnalyzeImport(self.root)
         self.analyzeDeclare = analyzer.AnalyzeDeclare(self.root)
         self.analyzeJump = analyzer.AnalyzeJump(self.root)
-        self.analyzeExpr = analyzer.AnalyzeExpr(self.root)
+        self.analyzeExpr = analyzer.AnalyzeExpr(self.root, self.jobs)
+
+    def locate(self, mod_name: str) -> Optional[Path]:
+        for path in self.paths:
+            source = path / f'{mod_name}.fin'
+            if source.is_file():
+                return source
+
+        return None
 
     def load_module(self,
                     mod_name: str,
                     parent: symbols.Module) -> symbols.Module:
-        # TODO: a better way to locate
-        loc = os.path.dirname(os.path.realpath(__file__))
-        filename = os.path.join(loc, 'ref', f'{mod_name}.fin')
-        mod = symbols.Module(mod_name, parent)
-        with open(filename) as src:
+        source = self.locate(mod_name)
+        assert source is not None
+        inter = interface.location(source)
+        digest = cache.digest(source)
+
+        # use the precompiled interface when it is up to date
+        data: Optional[Dict[str, Any]] = None
+        if cache.enabled():
+            data = interface.read(inter, digest)
+
+        if data is not None:
+            for name in interface.imports(data):
+                self.require_module(name, parent)
+
+            mod = symbols.Module(mod_name, parent)
+            interface.define(data, mod, parent)
+            return mod
+
+        with source.open() as src:
             tokens = self.lexer.read(src)
-            ast = self.parser.parse(tokens)
-            self.analyzeImport.analyze(ast, mod)
-            self.analyzeDeclare.analyze(ast, mod)
+            tree = self.parser.parse(tokens)
 
+        for name in imports(tree):
+            self.require_module(name, parent)
+
+        mod = symbols.Module(mod_name, parent)
+        self.analyzeImport.analyze(tree, mod)
+        self.analyzeDeclare.analyze(tree, mod)
+
+        if cache.enabled():
+            interface.write(mod, inter, digest)
+
+        return mod
+
+    def require_module(self,
+                       mod_name: str,
+                       parent: symbols.Module) -> Optional[symbols.Module]:
+        mod = parent.symbols.get(mod_name, None)
+        if isinstance(mod, symbols.Module):
+            return mod
+
+        mod = self.modules.get(mod_name, None)
+        if mod is not None:
+            for ref in mod.references.values():
+                self.require_module(ref.name, parent)
+
+            parent.add_module(mod)
+            return mod
+
+        # unknown modules are reported when the import is analyzed
+        if self.locate(mod_name) is None:
+            return None
+
+        mod = self.load_module(mod_name, parent)
+        self.modules[mod_name] = mod
         return mod
 
     def compile(self,
                 src: Iterable[str],
                 out: io.BytesIO,
                 name: str,
-                stage: str) -> None:
-        tokens = self.lexer.read(src)
+                stage: str) -> symbols.Module:
+        self.reset()
+        self.stats.passes = []
+        symbols.counting = self.stats.enabled
+        measure = self.stats.measure
+
+        if self.build_cache is not None:
+            # keep the text around for the cache key
+            src = list(src)
+
+        # tokens are only read ahead when they are needed or timed, otherwise
+        # they are lexed while parsing, and the time is counted for 'parse'
+        with measure('lex') as pas:
+            if stage == 'lex' or self.stats.enabled:
+                buf = self.lexer.read_buffer(src)
+                pas.count('tokens', len(buf))
+                tokens = iter(buf)
+            else:
+                tokens = self.lexer.read(src)
 
         if stage == 'lex':
-            lst = list(tokens)
-            for t in lst:
+            for t in buf:
                 print(t)
 
-            tokens = iter(lst)
+        with measure('parse') as pas:
+            ast = self.parser.parse(tokens)
 
-        ast = self.parser.parse(tokens)
+        if self.stats.enabled:
+            pas.count('nodes', count_nodes(ast))
 
         if stage == 'parse':
             ast.print()
 
-        self.load_module('rt', self.root)
+        with measure('load') as pas:
+            # rt is always available
+            self.require_module('rt', self.root)
+            for mod_name in imports(ast):
+                self.require_module(mod_name, self.root)
 
         mod = symbols.Module(name, self.root)
-        self.analyzeImport.analyze(ast, mod)
-        self.analyzeDeclare.analyze(ast, mod)
-        self.analyzeJump.analyze(ast, mod)
-        self.analyzeExpr.analyze(ast, mod)
+
+        with measure('import'):
+            self.analyzeImport.analyze(ast, mod)
+
+        with measure('declare'):
+            self.analyzeDeclare.analyze(ast, mod)
+
+        key = None
+        if self.build_cache is not None and stage == 'exec':
+            if self.fingerprint is None:
+                self.fingerprint = fingerprint()
+
+            refs = interface.dependencies(mod)
+            key = self.build_cache.key(
+                self.fingerprint,
+                'O' if self.optimizer is not None else '',
+                name,
+                ''.join(src),
+                *(f'{ref.fullname()}:{interface.digest(ref)}'
+                  for ref in refs))
+
+            data = self.build_cache.get(key)
+            if data is not None:
+                out.write(data)
+                return mod
+
+        with measure('jump'):
+            self.analyzeJump.analyze(ast, mod)
+
+        lookups = symbols.lookups.copy()
+        with measure('expr') as pas:
+            self.analyzeExpr.analyze(ast, mod)
+
+        lookups = symbols.lookups - lookups
+        pas.count('lookups', lookups['lookups'])
+        pas.count('hops', lookups['hops'])
+        pas.count('resolutions', self.analyzeExpr.resolutions)
+        pas.count('cached', self.analyzeExpr.overloads.hits)
+        pas.count('candidates', self.analyzeExpr.pruning['candidates'])
+        pas.count('pruned', self.analyzeExpr.pruning['pruned'])
+        pas.count('instances', self.analyzeExpr.instances.hits)
 
         if stage == 'ast':
             ast.print()
 
-        gen = self.generator.generate(ast, mod)
+        with measure('generate') as pas:
+            gen = self.generator.generate(ast,
+                                          mod,
+                                          self.analyzeExpr.instances)
+
+        if self.stats.enabled:
+            pas.count('instructions', count_instrs(gen))
+
+        if self.optimizer is not None:
+            hits = self.optimizer.hits.copy()
+            with measure('optimize') as pas:
+                gen = self.optimizer.optimize(gen)
+
+            if self.stats.enabled:
+                hits = self.optimizer.hits - hits
+                for rule, count in sorted(hits.items()):
+                    pas.count(rule, count)
+
+                pas.count('instructions', count_instrs(gen))
 
         if stage == 'asm':
             for ins in gen:
                 print(ins)
 
-        self.assembler.assemble(gen, out)
+        buf = io.BytesIO()
+        with measure('assemble') as pas:
+            self.assembler.assemble(gen, buf)
+
+        pas.count('bytes', len(buf.getvalue()))
+        out.write(buf.getvalue())
+
+        if key is not None:
+            self.build_cache.put(key, buf.getvalue())
+
+        return mod
+
+
+def check_request(req: Any) -> Optional[str]:
+    if not isinstance(req, dict):
+        return 'expected an object'
+
+    if ('src' in req) == ('source' in req):
+        return "expected exactly one of 'src' and 'source'"
+
+    for key in ['src', 'source', 'name', 'out']:
+        if key in req and not isinstance(req[key], str):
+            return f"'{key}' must be a string"
+
+    if req.get('stage', 'exec') not in STAGES:
+        return f"'stage' must be one of {', '.join(STAGES)}"
+
+    return None
+
+
+def handle(compiler: Compiler, req: Any) -> Dict[str, Any]:
+    err = check_request(req)
+    if err is not None:
+        return {'ok': False, 'error': f'invalid request: {err}'}
+
+    stage = req.get('stage', 'exec')
+    out = io.BytesIO()
+    printed = io.StringIO()
+
+    try:
+        with contextlib.redirect_stdout(printed):
+            if 'source' in req:
+                src = io.StringIO(req['source'])
+            else:
+                src = open(req['src'])
+
+            with src:
+                compiler.compile(src, out, req.get('name', 'main'), stage)
+
+        # only write output for successful compilations
+        if stage == 'exec':
+            with open(req.get('out', 'a.fm'), 'wb') as f:
+                f.write(out.getvalue())
+    except (error.CompilerError, error.AssemblerError) as e:
+        return {
+            'ok': False,
+            'error': f'{type(e).__name__}: {e.detail()}',
+            'output': printed.getvalue(),
+        }
+    except OSError as e:
+        return {
+            'ok': False,
+            'error': str(e),
+            'output': printed.getvalue(),
+        }
+    except Exception:
+        # internal errors are reported too, but never stop the server
+        return {
+            'ok': False,
+            'error': traceback.format_exc(),
+            'output': printed.getvalue(),
+        }
+
+    return {
+        'ok': True,
+        'output': printed.getvalue(),
+    }
+
+
+def serve(compiler: Compiler) -> None:
+    # one JSON request per line on stdin, one JSON response per line on stdout
+    for line in sys.stdin:
+        if line.strip() == '':
+            continue
+
+        try:
+            req = json.loads(line)
+        except ValueError as e:
+            res = {'ok': False, 'error': f'invalid request: {e}'}
+        else:
+            res = handle(compiler, req)
+
+            if isinstance(req, dict) and 'id' in req:
+                res['id'] = req['id']
+
+        print(json.dumps(res), flush=True)
+
+
+# compiler of the current worker process in batch mode
+_worker: Optional[Compiler] = None
+
+
+def _get_worker(paths: List[Path],
+                cache_limit: Optional[int],
+                optimize: bool) -> Compiler:
+    global _worker
+    if _worker is None:
+        _worker = Compiler(paths, cache_limit, optimize=optimize)
+
+    return _worker
+
+
+def scan_job(paths: List[Path],
+             cache_limit: Optional[int],
+             optimize: bool,
+             source: Path) -> Tuple[List[str], Optional[str]]:
+    compiler = _get_worker(paths, cache_limit, optimize)
+
+    try:
+        with source.open() as src:
+            tree = compiler.parser.parse(compiler.lexer.read(src))
+    except error.CompilerError as e:
+        return [], f'{type(e).__name__}: {e.detail()}'
+    except Exception:
+        # exceptions are not necessarily picklable
+        return [], traceback.format_exc()
+
+    return imports(tree), None
+
+
+def compile_job(paths: List[Path],
+                cache_limit: Optional[int],
+                optimize: bool,
+                source: Path,
+                out: Path) -> Tuple[Optional[str], Counter]:
+    compiler = _get_worker(paths, cache_limit, optimize)
+    buf = io.BytesIO()
+
+    # only report the cache statistics of this job
+    cache_stats: Counter = Counter()
+    if compiler.build_cache is not None:
+        compiler.build_cache.stats = cache_stats
+
+    try:
+        with source.open() as src:
+            mod = compiler.compile(src, buf, source.stem, 'exec')
+
+        with out.open('wb') as f:
+            f.write(buf.getvalue())
+
+        # let dependents load this module from its interface; when it cannot
+        # be written they compile the source instead
+        if cache.enabled():
+            interface.write(mod,
+                            interface.location(source),
+                            cache.digest(source))
+    except (error.CompilerError, error.AssemblerError) as e:
+        return f'{type(e).__name__}: {e.detail()}', cache_stats
+    except OSError as e:
+        return str(e), cache_stats
+    except Exception:
+        # exceptions are not necessarily picklable
+        return traceback.format_exc(), cache_stats
+
+    return None, cache_stats
+
+
+def compile_batch(sources: List[Path],
+                  out_dir: Optional[Path],
+                  jobs: Optional[int],
+                  cache_limit: Optional[int],
+                  optimize: bool = False) -> bool:
+    names: Dict[str, Path] = {}
+    for source in sources:
+        if source.stem in names:
+            print(f'{source}: module {source.stem} already defined by '
+                  f'{names[source.stem]}', file=sys.stderr)
+            return False
+
+        names[source.stem] = source
+
+    # modules of the batch can import each other
+    paths = sorted({source.parent for source in sources})
+    ok = True
+
+    with futures.ProcessPoolExecutor(jobs) as pool:
+        pending: Dict[str, Set[str]] = {}
+        scans = pool.map(scan_job,
+                         itertools.repeat(paths),
+                         itertools.repeat(cache_limit),
+                         itertools.repeat(optimize),
+                         sources)
+        for source, (deps, err) in zip(sources, scans):
+            if err is not None:
+                print(f'{source}: {err}', file=sys.stderr)
+                ok = False
+                continue
+
+            pending[source.stem] = {d for d in deps
+                                    if d in names and d != source.stem}
+
+        # modules that failed to scan never finish
+        failed = set(names) - set(pending)
+        done: Set[str] = set()
+        running: Dict[futures.Future, str] = {}
+        cache_stats: Counter = Counter()
+
+        while pending or running:
+            progress = False
+            for name in sorted(pending):
+                deps = pending[name]
+                if deps & failed:
+                    print(f'{names[name]}: skipped due to failed imports',
+                          file=sys.stderr)
+                    failed.add(name)
+                elif deps <= done:
+                    out = (out_dir / f'{name}.fm' if out_dir is not None
+                           else names[name].with_suffix('.fm'))
+                    fut = pool.submit(compile_job, paths, cache_limit,
+                                      optimize, names[name], out)
+                    running[fut] = name
+                else:
+                    continue
+
+                del pending[name]
+                progress = True
+
+            if progress:
+                continue
+
+            if not running:
+                for name in sorted(pending):
+                    print(f'{names[name]}: circular import', file=sys.stderr)
+
+                return False
+
+            finished, _ = futures.wait(running,
+                                       return_when=futures.FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                err, job_stats = fut.result()
+                cache_stats.update(job_stats)
+
+                if err is None:
+                    done.add(name)
+                else:
+                    print(f'{names[name]}: {err}', file=sys.stderr)
+                    failed.add(name)
+
+    if cache_limit is not None and cache.enabled():
+        print(cache.report(cache_stats), file=sys.stderr)
+
+    return ok and not failed
+
+
+def reject(ag: argparse.ArgumentParser,
+           mode: str,
+           flags: List[Tuple[str, Any]]) -> None:
+    # flags without effect in a mode are errors rather than silently ignored
+    for flag, value in flags:
+        if value is not None and value is not False:
+            ag.error(f'{flag} is not supported when {mode}')
 
 
 def main() -> None:
     ag = argparse.ArgumentParser(description='Fin compiler.')
-    ag.add_argument('src', type=argparse.FileType(), metavar='input',
-                    help='source file')
+    ag.add_argument('src', metavar='input', nargs='*',
+                    help='source files or directories')
     ag.add_argument('-o', '--out', dest='out', metavar='<output>',
-                    type=argparse.FileType('wb'), default='a.fm',
-                    help='write output to <output>')
+                    help='write output to <output> (default: a.fm)')
     ag.add_argument('-n', '--name', dest='name', metavar='<name>',
-                    default='main',
-                    help='name of the module')
+                    help='name of the module (default: main)')
     ag.add_argument('-s', '--stage', dest='stage', metavar='<stage>',
-                    default='exec',
-                    choices=['lex', 'parse', 'ast', 'asm', 'exec'],
+                    choices=STAGES,
                     help='compilation stage')
     ag.add_argument('-d', '--debug', dest='debug', action='store_true',
                     help='enable debug information')
+    ag.add_argument('--serve', dest='serve', action='store_true',
+                    help='serve JSON compile requests on stdin')
+    ag.add_argument('--out-dir', dest='out_dir', metavar='<dir>',
+                    help='compile all inputs, writing modules to <dir>')
+    ag.add_argument('-j', '--jobs', dest='jobs', metavar='<n>', type=int,
+                    help='number of parallel jobs; in batch mode modules are '
+                    'compiled in parallel, otherwise function bodies are '
+                    'analyzed in parallel')
+    ag.add_argument('-O', '--optimize', dest='optimize',
+                    action='store_true',
+                    help='run peephole optimizations on generated code')
+    ag.add_argument('-i', '--incremental', dest='incremental',
+                    action='store_true',
+                    help='reuse cached outputs of unchanged modules')
+    ag.add_argument('--cache-size', dest='cache_size', metavar='<MiB>',
+                    type=int, default=256,
+                    help='size limit of the incremental build cache')
+    ag.add_argument('--time-passes', dest='time_passes', action='store_true',
+                    help='report time, memory and counters of each pass')
+    ag.add_argument('--stats', dest='stats', metavar='<file>',
+                    help='write statistics of each pass as JSON to <file>')
     args = ag.parse_args()
 
-    compiler = Compiler()
+    cache_limit = None
+    if args.incremental:
+        cache_limit = args.cache_size * 1024 * 1024
+
+    if args.serve:
+        # requests name their own inputs, outputs and stages
+        reject(ag, 'serving requests', [('input', args.src or None),
+                                        ('-o', args.out),
+                                        ('-n', args.name),
+                                        ('-s', args.stage),
+                                        ('--out-dir', args.out_dir),
+                                        ('-j', args.jobs),
+                                        ('-i', args.incremental),
+                                        ('--time-passes', args.time_passes),
+                                        ('--stats', args.stats)])
+
+        serve(Compiler(optimize=args.optimize))
+        return
+
+    if len(args.src) == 0:
+        ag.error('the following arguments are required: input')
+
+    batch = (args.out_dir is not None or len(args.src) > 1 or
+             any(os.path.isdir(src) for src in args.src))
+
+    if batch:
+        # modules are named after their files, and are always fully compiled
+        reject(ag, 'compiling several inputs', [('-o', args.out),
+                                                ('-n', args.name),
+                                                ('-s', args.stage),
+                                                ('--time-passes',
+                                                 args.time_passes),
+                                                ('--stats', args.stats)])
+
+        sources: List[Path] = []
+        for src in map(Path, args.src):
+            if src.is_dir():
+                sources += sorted(src.glob('*.fin'))
+            else:
+                sources.append(src)
+
+        out_dir = None
+        if args.out_dir is not None:
+            out_dir = Path(args.out_dir)
+            out_dir.mkdir(parents=True, exist_ok=True)
+
+        if not compile_batch(sources, out_dir, args.jobs, cache_limit,
+                             args.optimize):
+            exit(1)
 
-    if args.debug:
-        # don't catch any exceptions
-        compiler.compile(args.src, args.out, args.name, args.stage)
         return
 
     try:
-        compiler.compile(args.src, args.out, args.name, args.stage)
-    except error.CompilerError as e:
-        print(f'{type(e).__name__}: {e.detail()}', file=sys.stderr)
-        exit(1)
+        src = argparse.FileType()(args.src[0])
+        out = argparse.FileType('wb')(args.out or 'a.fm')
+    except argparse.ArgumentTypeError as e:
+        ag.error(str(e))
+
+    compiler = Compiler(cache_limit=cache_limit,
+                        jobs=args.jobs,
+                        optimize=args.optimize)
+    compiler.stats.enabled = args.time_passes or args.stats is not None
+
+    name = args.name or 'main'
+    stage = args.stage or 'exec'
+
+    if args.debug:
+        # don't catch any exceptions
+        compiler.compile(src, out, name, stage)
+    else:
+        try:
+            compiler.compile(src, out, name, stage)
+        except (error.CompilerError, error.AssemblerError) as e:
+            print(f'{type(e).__name__}: {e.detail()}', file=sys.stderr)
+            exit(1)
+
+    if compiler.build_cache is not None:
+        print(cache.report(compiler.build_cache.stats), file=sys.stderr)
+
+    if args.time_passes:
+        print(compiler.stats.report(), file=sys.stderr)
+
+    if args.stats is not None:
+        with open(args.stats, 'w') as f:
+            json.dump(compiler.stats.dump(), f, indent=2)
 
 
 if __name__ == '__main__':
@@ -1,13 +1,28 @@
-from typing import Sequence, Set, Dict, TypeVar, Callable, Any, Type
+from typing import Sequence, Set, Dict, TypeVar, Callable, Any, Type, \
+    FrozenSet, Hashable, List, Tuple
+from collections import Counter
+import copyreg
+import io
+import multiprocessing
+import pickle
+import traceback
 from . import ast
 from . import builtin
 from . import error
 from . import pattern
 from . import symbols
+from . import tokens
 from . import types
+from . import visitor
 
 TFn = TypeVar('TFn', bound=Callable[..., Any])
 
+# function bodies analyzed by each task of the worker pool
+CHUNK_SIZE = 16
+
+# below this many functions, starting the workers costs more than it saves
+MIN_PARALLEL = 64
+
 
 def get_symbol(syms: symbols.SymbolTable,
                path: ast.Path,
@@ -134,6 +149,42 @@ def get_pattern(node: ast.Pattern,
     return pat
 
 
+class OverloadCache:
+    # sources of the winning overloads, by candidate sources, argument types
+    # and expected return type; types are interned, so they can be used in
+    # the key directly
+    def __init__(self) -> None:
+        self._winners: Dict[Hashable, FrozenSet[symbols.SymbolTable]] = {}
+        self.hits = 0
+
+    def clear(self) -> None:
+        # must be called when functions are declared, as the same call can
+        # then resolve differently
+        self._winners.clear()
+
+    def resolve(self,
+                matches: Set[types.Match],
+                args: Sequence[types.Type],
+                ret: types.Type) -> Set[types.Match]:
+        key = (frozenset(m.source for m in matches), tuple(args), ret)
+
+        winners = self._winners.get(key)
+        if winners is None:
+            res = types.resolve_overload(matches, args, ret)
+            self._winners[key] = frozenset(m.source for m in res)
+            return res
+
+        self.hits += 1
+
+        # the winners still need to resolve their generics against the
+        # arguments
+        res = {m for m in matches if m.source in winners}
+        for match in res:
+            match.update(args, ret)
+
+        return res
+
+
 class OverloadSet:
     def __init__(self,
                  matches: Set[types.Match],
@@ -141,8 +192,17 @@ class OverloadSet:
         self.matches = matches
         self.args = args
 
-    def resolve(self, ret: types.Type, required: bool = False) -> types.Match:
-        self.matches = types.resolve_overload(self.matches, self.args, ret)
+    def resolve(self,
+                ret: types.Type,
+                required: bool = False,
+                cache: OverloadCache = None,
+                instances: types.Instantiations = None) -> types.Match:
+        if cache is not None:
+            self.matches = cache.resolve(self.matches, self.args, ret)
+        else:
+            self.matches = types.resolve_overload(self.matches,
+                                                  self.args,
+                                                  ret)
 
         if len(self.matches) == 0:
             raise error.SymbolError(
@@ -160,7 +220,7 @@ class OverloadSet:
 
         match = next(iter(self.matches))
 
-        if not match.resolve():
+        if not match.resolve(instances):
             if not required:
                 return None
 
@@ -276,6 +336,7 @@ class AnalyzeJump(Analyzer):
             self._recurse(expr.condition, fn, whl)
 
             # use current while
+            expr.breaks = []
             self._recurse(expr.content, fn, expr)
 
             self._recurse(expr.failure, fn, whl)
@@ -299,437 +360,680 @@ class AnalyzeJump(Analyzer):
 
             expr.target = whl
 
+            if isinstance(expr, ast.Break):
+                whl.breaks.append(expr)
+
         else:
             for child in expr.children():
                 if isinstance(child, ast.Expr):
                     self._recurse(child, fn, whl)
 
 
-class AnalyzeExpr(Analyzer):
-    def __init__(self, *args, **kargs) -> None:
-        Analyzer.__init__(self, *args, **kargs)
+class AnalyzeExpr(Analyzer, visitor.Visitor):
+    def __init__(self, root: symbols.Module, jobs: int = None) -> None:
+        Analyzer.__init__(self, root)
+
+        # number of worker processes analyzing function bodies in parallel
+        self.jobs = jobs
 
         self.module: symbols.Module
         self.matches: Dict[ast.Node, OverloadSet]
 
+        # number of overload resolutions attempted
+        self.resolutions = 0
+        self.overloads = OverloadCache()
+        self.instances = types.Instantiations()
+
+        # candidate overloads looked at, and rejected before matching
+        self.pruning: Counter = Counter()
+
     def analyze(self, file: ast.File, mod: symbols.Module) -> None:
         self.module = mod
         self.matches = {}
+        self.resolutions = 0
+        self.overloads.clear()
+        self.overloads.hits = 0
+        self.pruning.clear()
 
-        for decl in file:
-            if isinstance(decl, ast.Def):
-                self._expr(decl.body, decl.symbol)
+        defs = [decl for decl in file if isinstance(decl, ast.Def)]
 
-        for decl in file:
-            if isinstance(decl, ast.Def):
-                decl.body = self._expect(decl.body, decl.symbol.ret)
+        # function bodies only depend on the declarations, so they can be
+        # analyzed independently of each other
+        if self.jobs is not None and self.jobs > 1 and \
+                len(defs) >= MIN_PARALLEL and \
+                'fork' in multiprocessing.get_all_start_methods():
+            self._analyze_parallel(defs)
+            return
+
+        for decl in defs:
+            self._expr(decl.body, decl.symbol)
+
+        for decl in defs:
+            decl.body = self._expect(decl.body, decl.symbol.ret)
+
+    def _analyze_parallel(self, defs: List[ast.Def]) -> None:
+        global _job
+
+        shared = _shared(self.root, defs)
+        chunks = [range(i, min(i + CHUNK_SIZE, len(defs)))
+                  for i in range(0, len(defs), CHUNK_SIZE)]
+
+        # the workers are forked with a copy of everything analyzed so far,
+        # and shared objects in their results are looked up by id
+        _job = (self, defs, shared)
+        try:
+            with multiprocessing.get_context('fork').Pool(self.jobs) as pool:
+                data = pool.map(_analyze_chunk, chunks, chunksize=1)
+
+            loaded = [pickle.loads(chunk) for chunk in data]
+        finally:
+            _job = None
+
+        results: List[Tuple[str, Any]] = []
+        for res, counts in loaded:
+            results += res
+
+            resolutions, hits, pruning, instances, lookups = counts
+            self.resolutions += resolutions
+            self.overloads.hits += hits
+            self.pruning.update(pruning)
+            self.instances.hits += instances
+            symbols.lookups.update(lookups)
+
+        # report the same error as the sequential mode, where all bodies are
+        # updated before any of them is checked against its return type
+        for phase in ['update', 'expect']:
+            for res_phase, res in results:
+                if res_phase == phase:
+                    raise res
+
+        for decl, (_, (body, locs)) in zip(defs, results):
+            decl.body = body
+            decl.symbol.locals = locs
+
+    def _resolve(self,
+                 os: OverloadSet,
+                 ret: types.Type,
+                 required: bool = False) -> types.Match:
+        self.resolutions += 1
+        return os.resolve(ret, required, self.overloads, self.instances)
 
     def _expr(self, expr: ast.Expr, syms: symbols.SymbolTable) -> None:
         try:
-            self._update(expr, syms)
+            self.visit('update', expr, syms)
         except error.SymbolError as e:
             raise error.AnalyzerError(str(e), expr, e.symbol)
 
-    def _update(self, expr: ast.Expr, syms: symbols.SymbolTable) -> None:
-        if isinstance(expr, ast.Block):
-            syms = symbols.Block(syms)
-            for child in expr:
-                self._expr(child, syms)
+    @visitor.on('update', ast.Block)
+    def _update_block(self,
+                      expr: ast.Block,
+                      syms: symbols.SymbolTable) -> None:
+        syms = symbols.Block(syms)
+        for child in expr:
+            self._expr(child, syms)
 
-            expr.block = syms
-            expr.expr_type = expr.items[-1].expr_type
+        expr.block = syms
+        expr.expr_type = expr.items[-1].expr_type
 
-        elif isinstance(expr, ast.Let):
-            if expr.value is not None:
-                self._expr(expr.value, syms)
+    @visitor.on('update', ast.Let)
+    def _update_let(self, expr: ast.Let, syms: symbols.SymbolTable) -> None:
+        if expr.value is not None:
+            self._expr(expr.value, syms)
 
-            tp = get_type(syms, expr.type)
-            if tp is None:
-                if expr.value is None:
+        tp = get_type(syms, expr.type)
+        if tp is None:
+            if expr.value is None:
+                raise error.AnalyzerError(
+                    'type is required when not assigning a value',
+                    expr)
+
+            tp = expr.value.expr_type
+
+            if isinstance(tp, types.Special):
+                if tp == builtin.UNKNOWN:
                     raise error.AnalyzerError(
-                        'type is required when not assigning a value',
+                        'unable to infer type, type annotation required',
                         expr)
 
-                tp = expr.value.expr_type
+                raise error.AnalyzerError(
+                    f'cannot create variable of type {tp}',
+                    expr)
 
-                if isinstance(tp, types.Special):
-                    if tp == builtin.UNKNOWN:
-                        raise error.AnalyzerError(
-                            'unable to infer type, type annotation required',
-                            expr)
+        assert isinstance(syms, symbols.Block)
 
-                    raise error.AnalyzerError(
-                        f'cannot create variable of type {tp}',
-                        expr)
+        expr.symbol = syms.add_local(expr.name, tp)
+        expr.expr_type = builtin.VOID
 
-            assert isinstance(syms, symbols.Block)
+    @visitor.on('update', ast.If)
+    def _update_if(self, expr: ast.If, syms: symbols.SymbolTable) -> None:
+        self._expr(expr.condition, syms)
+        self._expr(expr.success, syms)
+        self._expr(expr.failure, syms)
 
-            expr.symbol = syms.add_local(expr.name, tp)
-            expr.expr_type = builtin.VOID
+        tps = [expr.success.expr_type, expr.failure.expr_type]
+        res = types.Resolution()
+        expr.expr_type = res.interpolate_types(tps)
 
-        elif isinstance(expr, ast.If):
-            self._expr(expr.condition, syms)
-            self._expr(expr.success, syms)
-            self._expr(expr.failure, syms)
+    @visitor.on('update', ast.While)
+    def _update_while(self,
+                      expr: ast.While,
+                      syms: symbols.SymbolTable) -> None:
+        self._expr(expr.condition, syms)
+        self._expr(expr.content, syms)
+        self._expr(expr.failure, syms)
 
-            tps = [expr.success.expr_type, expr.failure.expr_type]
-            res = types.Resolution()
-            expr.expr_type = res.interpolate_types(tps)
+        tps = [b.value.expr_type for b in expr.breaks]
+        tps.append(expr.failure.expr_type)
 
-        elif isinstance(expr, ast.While):
-            self._expr(expr.condition, syms)
-            self._expr(expr.content, syms)
-            self._expr(expr.failure, syms)
+        res = types.Resolution()
+        expr.expr_type = res.interpolate_types(tps)
 
-            bks = expr.content.decedents(ast.Break)
-            tps = [b.value.expr_type for b in bks]
-            tps.append(expr.failure.expr_type)
+    @visitor.on('update', ast.Match)
+    def _update_match(self,
+                      expr: ast.Match,
+                      syms: symbols.SymbolTable) -> None:
+        self._expr(expr.expr, syms)
+        for arm in expr.arms:
+            arm_syms = symbols.Block(syms)
 
-            res = types.Resolution()
-            expr.expr_type = res.interpolate_types(tps)
+            tp = arm.target.expr.expr_type
 
-        elif isinstance(expr, ast.Match):
-            self._expr(expr.expr, syms)
-            for arm in expr.arms:
-                arm_syms = symbols.Block(syms)
+            arm.pat = get_pattern(arm.pattern, arm_syms, tp)
 
-                tp = arm.target.expr.expr_type
+            for v in arm.pat.variables():
+                var = arm_syms.add_local(v.name, v.type)
+                v.set_variable(var)
 
-                arm.pat = get_pattern(arm.pattern, arm_syms, tp)
+            self._expr(arm.content, arm_syms)
 
-                for v in arm.pat.variables():
-                    var = arm_syms.add_local(v.name, v.type)
-                    v.set_variable(var)
+        tps = [arm.content.expr_type for arm in expr.arms]
 
-                self._expr(arm.content, arm_syms)
+        res = types.Resolution()
+        expr.expr_type = res.interpolate_types(tps)
 
-            tps = [arm.content.expr_type for arm in expr.arms]
+    @visitor.on('update', ast.BinTest)
+    def _update_bin_test(self,
+                         expr: ast.BinTest,
+                         syms: symbols.SymbolTable) -> None:
+        self._expr(expr.left, syms)
+        self._expr(expr.right, syms)
 
-            res = types.Resolution()
-            expr.expr_type = res.interpolate_types(tps)
+        expr.expr_type = builtin.BOOL
 
-        elif isinstance(expr, ast.BinTest):
-            self._expr(expr.left, syms)
-            self._expr(expr.right, syms)
+    @visitor.on('update', ast.NotTest)
+    def _update_not_test(self,
+                         expr: ast.NotTest,
+                         syms: symbols.SymbolTable) -> None:
+        self._expr(expr.expr, syms)
 
-            expr.expr_type = builtin.BOOL
+        expr.expr_type = builtin.BOOL
 
-        elif isinstance(expr, ast.NotTest):
-            self._expr(expr.expr, syms)
+    @visitor.on('update', ast.Call)
+    def _update_call(self, expr: ast.Call, syms: symbols.SymbolTable) -> None:
+        for child in expr.arguments:
+            self._expr(child, syms)
 
-            expr.expr_type = builtin.BOOL
+        sym = get_symbol(syms,
+                         expr.path,
+                         symbols.FunctionGroup,
+                         symbols.Struct,
+                         symbols.Variant)
 
-        elif isinstance(expr, ast.Call):
-            for child in expr.arguments:
-                self._expr(child, syms)
+        assert isinstance(sym, (symbols.FunctionGroup,
+                                symbols.Struct,
+                                symbols.Variant))
 
-            sym = get_symbol(syms,
-                             expr.path,
-                             symbols.FunctionGroup,
-                             symbols.Struct,
-                             symbols.Variant)
+        args = [c.expr_type for c in expr.arguments]
+        matches = sym.overloads(args, self.pruning)
 
-            assert isinstance(sym, (symbols.FunctionGroup,
-                                    symbols.Struct,
-                                    symbols.Variant))
+        expr.expr_type = builtin.UNKNOWN
+        os = OverloadSet(matches, args)
+        self.matches[expr] = os
 
-            matches = sym.overloads()
+        match = self._resolve(os, expr.expr_type)
 
-            assert len(matches) > 0, 'overloads returned empty set'
+        if match is not None:
+            expr.match = match
+            expr.expr_type = match.ret
 
-            expr.expr_type = builtin.UNKNOWN
-            args = [c.expr_type for c in expr.arguments]
-            os = OverloadSet(matches, args)
-            self.matches[expr] = os
+    @visitor.on('update', ast.Method)
+    def _update_method(self,
+                       expr: ast.Method,
+                       syms: symbols.SymbolTable) -> None:
+        self._expr(expr.object, syms)
+        for child in expr.arguments:
+            self._expr(child, syms)
 
-            match = os.resolve(expr.expr_type)
+        sym = get_symbol(syms, expr.path, symbols.FunctionGroup)
 
-            if match is not None:
-                expr.match = match
-                expr.expr_type = match.ret
+        assert isinstance(sym, symbols.FunctionGroup)
 
-        elif isinstance(expr, ast.Method):
-            self._expr(expr.object, syms)
-            for child in expr.arguments:
-                self._expr(child, syms)
+        args = [expr.object.expr_type] + \
+            [c.expr_type for c in expr.arguments]
+        matches = sym.overloads(args, self.pruning)
 
-            sym = get_symbol(syms, expr.path, symbols.FunctionGroup)
+        expr.expr_type = builtin.UNKNOWN
+        os = OverloadSet(matches, args)
+        self.matches[expr] = os
 
-            assert isinstance(sym, symbols.FunctionGroup)
+        match = self._resolve(os, expr.expr_type)
 
-            matches = sym.overloads()
+        if match is not None:
+            expr.match = match
+            expr.expr_type = match.ret
 
-            assert len(matches) > 0, 'overloads returned empty set'
+    @visitor.on('update', ast.Op)
+    def _update_op(self, expr: ast.Op, syms: symbols.SymbolTable) -> None:
+        for child in expr.arguments:
+            self._expr(child, syms)
 
-            expr.expr_type = builtin.UNKNOWN
-            args = [expr.object.expr_type] + \
-                [c.expr_type for c in expr.arguments]
-            os = OverloadSet(matches, args)
-            self.matches[expr] = os
+        args = [c.expr_type for c in expr.arguments]
+        matches = self.module.operators(expr.operator, args, self.pruning)
 
-            match = os.resolve(expr.expr_type)
+        expr.expr_type = builtin.UNKNOWN
+        os = OverloadSet(matches, args)
+        self.matches[expr] = os
 
-            if match is not None:
-                expr.match = match
-                expr.expr_type = match.ret
+        match = self._resolve(os, expr.expr_type)
 
-        elif isinstance(expr, ast.Op):
-            for child in expr.arguments:
-                self._expr(child, syms)
+        if match is not None:
+            expr.match = match
+            expr.expr_type = match.ret
 
-            matches = self.module.operators(expr.operator)
+    @visitor.on('update', ast.Cast)
+    def _update_cast(self, expr: ast.Cast, syms: symbols.SymbolTable) -> None:
+        self._expr(expr.expr, syms)
 
-            assert len(matches) > 0, 'operators returned empty set'
+        args = [expr.expr.expr_type]
+        matches = self.module.operators('cast', args, self.pruning)
 
-            expr.expr_type = builtin.UNKNOWN
-            args = [c.expr_type for c in expr.arguments]
-            os = OverloadSet(matches, args)
-            self.matches[expr] = os
+        expr.expr_type = get_type(syms, expr.type)
+        os = OverloadSet(matches, args)
+        expr.match = self._resolve(os, expr.expr_type, required=True)
 
-            match = os.resolve(expr.expr_type)
+    @visitor.on('update', ast.Member)
+    def _update_member(self,
+                       expr: ast.Member,
+                       syms: symbols.SymbolTable) -> None:
+        self._expr(expr.expr, syms)
 
-            if match is not None:
-                expr.match = match
-                expr.expr_type = match.ret
+        tp = types.remove_ref(expr.expr.expr_type)
 
-        elif isinstance(expr, ast.Cast):
-            self._expr(expr.expr, syms)
+        if not isinstance(tp, types.StructType):
+            raise error.AnalyzerError(
+                'member access requires struct type',
+                expr.member)
 
-            matches = self.module.operators('cast')
+        if expr.member.path is not None:
+            raise error.AnalyzerError(
+                'path member access unsupported',
+                expr.member)
 
-            expr.expr_type = get_type(syms, expr.type)
-            args = [expr.expr.expr_type]
-            os = OverloadSet(matches, args)
-            expr.match = os.resolve(expr.expr_type, required=True)
+        var = tp.fields[expr.member.name]
+        expr.expr_type = var.var_type()
 
-        elif isinstance(expr, ast.Member):
-            self._expr(expr.expr, syms)
+    @visitor.on('update', ast.Var)
+    def _update_var(self, expr: ast.Var, syms: symbols.SymbolTable) -> None:
+        sym = get_symbol(syms,
+                         expr.path,
+                         symbols.Variable,
+                         symbols.Constant)
+        assert isinstance(sym, (symbols.Variable, symbols.Constant))
+
+        expr.variable = sym
+        expr.expr_type = sym.var_type()
+
+    @visitor.on('update', ast.Const)
+    def _update_const(self,
+                      expr: ast.Const,
+                      syms: symbols.SymbolTable) -> None:
+        if expr.type == 'num':
+            expr.expr_type = builtin.INT
+        elif expr.type == 'float':
+            expr.expr_type = builtin.FLOAT
+        else:
+            assert False, 'unknown const type'
 
-            tp = types.remove_ref(expr.expr.expr_type)
+    @visitor.on('update', ast.Assn)
+    def _update_assn(self, expr: ast.Assn, syms: symbols.SymbolTable) -> None:
+        self._expr(expr.variable, syms)
+        self._expr(expr.value, syms)
 
-            if not isinstance(tp, types.StructType):
-                raise error.AnalyzerError(
-                    'member access requires struct type',
-                    expr.member)
+        expr.expr_type = builtin.VOID
 
-            if expr.member.path is not None:
-                raise error.AnalyzerError(
-                    'path member access unsupported',
-                    expr.member)
-
-            var = tp.fields[expr.member.name]
-            expr.expr_type = var.var_type()
-
-        elif isinstance(expr, ast.Var):
-            sym = get_symbol(syms,
-                             expr.path,
-                             symbols.Variable,
-                             symbols.Constant)
-            assert isinstance(sym, (symbols.Variable, symbols.Constant))
-
-            expr.variable = sym
-            expr.expr_type = sym.var_type()
-
-        elif isinstance(expr, ast.Const):
-            if expr.type == 'num':
-                expr.expr_type = builtin.INT
-            elif expr.type == 'float':
-                expr.expr_type = builtin.FLOAT
-            else:
-                assert False, 'unknown const type'
-
-        elif isinstance(expr, ast.Assn):
-            self._expr(expr.variable, syms)
-            self._expr(expr.value, syms)
+    @visitor.on('update', ast.IncAssn)
+    def _update_inc_assn(self,
+                         expr: ast.IncAssn,
+                         syms: symbols.SymbolTable) -> None:
+        self._expr(expr.variable, syms)
+        self._expr(expr.value, syms)
 
-            expr.expr_type = builtin.VOID
+        args = [expr.variable.expr_type, expr.value.expr_type]
+        matches = self.module.operators(expr.operator, args, self.pruning)
 
-        elif isinstance(expr, ast.IncAssn):
-            self._expr(expr.variable, syms)
-            self._expr(expr.value, syms)
+        expr.expr_type = builtin.VOID
+        ret = types.remove_ref(expr.variable.expr_type)
+        os = OverloadSet(matches, args)
 
-            matches = self.module.operators(expr.operator)
+        expr.match = self._resolve(os, ret, required=True)
+        expr.expr_type = builtin.VOID
 
-            assert len(matches) > 0
+    @visitor.on('update', ast.Return, ast.Break)
+    def _update_return_break(self,
+                             expr: ast.Expr,
+                             syms: symbols.SymbolTable) -> None:
+        self._expr(expr.value, syms)
 
-            expr.expr_type = builtin.VOID
-            args = [expr.variable.expr_type, expr.value.expr_type]
-            ret = types.remove_ref(expr.variable.expr_type)
-            os = OverloadSet(matches, args)
+        expr.expr_type = builtin.DIVERGE
 
-            expr.match = os.resolve(ret, required=True)
-            expr.expr_type = builtin.VOID
+    @visitor.on('update', ast.Continue, ast.Redo)
+    def _update_continue_redo(self,
+                              expr: ast.Expr,
+                              syms: symbols.SymbolTable) -> None:
+        expr.expr_type = builtin.DIVERGE
 
-        elif isinstance(expr, (ast.Return, ast.Break)):
-            self._expr(expr.value, syms)
+    @visitor.on('update', ast.Noop)
+    def _update_noop(self, expr: ast.Noop, syms: symbols.SymbolTable) -> None:
+        expr.expr_type = builtin.VOID
 
-            expr.expr_type = builtin.DIVERGE
+    def _expect(self, expr: ast.Expr, tar_type: types.Type) -> ast.Expr:
+        self.visit('expect', expr, tar_type)
+        return self._cast(expr, tar_type)
 
-        elif isinstance(expr, (ast.Continue, ast.Redo)):
-            expr.expr_type = builtin.DIVERGE
+    @visitor.on('expect', ast.Block)
+    def _expect_block(self, expr: ast.Block, tar_type: types.Type) -> None:
+        for i in range(len(expr) - 1):
+            expr[i] = self._expect(expr[i], builtin.VOID)
+
+        expr[-1] = self._expect(expr[-1], tar_type)
+
+        expr.expr_type = tar_type
+
+    @visitor.on('expect', ast.Let)
+    def _expect_let(self, expr: ast.Let, tar_type: types.Type) -> None:
+        if expr.value is not None:
+            expr.value = self._expect(expr.value, expr.symbol.type)
+
+    @visitor.on('expect', ast.If)
+    def _expect_if(self, expr: ast.If, tar_type: types.Type) -> None:
+        expr.condition = self._expect(expr.condition, builtin.BOOL)
+        expr.success = self._expect(expr.success, tar_type)
+        expr.failure = self._expect(expr.failure, tar_type)
+
+        expr.expr_type = tar_type
+
+    @visitor.on('expect', ast.While)
+    def _expect_while(self, expr: ast.While, tar_type: types.Type) -> None:
+        expr.condition = self._expect(expr.condition, builtin.BOOL)
+        expr.content = self._expect(expr.content, builtin.VOID)
+        expr.failure = self._expect(expr.failure, tar_type)
+
+        expr.expr_type = tar_type
+
+    @visitor.on('expect', ast.Match)
+    def _expect_match(self, expr: ast.Match, tar_type: types.Type) -> None:
+        # TODO: this is inefficient - level can be lowered when applicable
+        expr.expr = self._expect(expr.expr, expr.expr.expr_type)
+        for arm in expr.arms:
+            arm.content = self._expect(arm.content, tar_type)
+
+        expr.expr_type = tar_type
+
+    @visitor.on('expect', ast.BinTest)
+    def _expect_bin_test(self,
+                         expr: ast.BinTest,
+                         tar_type: types.Type) -> None:
+        expr.left = self._expect(expr.left, builtin.BOOL)
+        expr.right = self._expect(expr.right, builtin.BOOL)
+
+    @visitor.on('expect', ast.NotTest)
+    def _expect_not_test(self,
+                         expr: ast.NotTest,
+                         tar_type: types.Type) -> None:
+        expr.expr = self._expect(expr.expr, builtin.BOOL)
+
+    @visitor.on('expect', ast.Call, ast.Op)
+    def _expect_call_op(self, expr: ast.Expr, tar_type: types.Type) -> None:
+        if expr.match is None:
+            os = self.matches[expr]
+            match = self._resolve(os, tar_type, required=True)
+
+            expr.match = match
+            expr.expr_type = match.ret
+
+        if isinstance(expr, ast.Op) and \
+                not isinstance(expr.match.source, symbols.Function):
+            raise error.AnalyzerError('operator not a function', expr)
+
+        assert len(expr.arguments) == len(expr.match.params)
+        for i in range(len(expr.arguments)):
+            tp = expr.match.params[i].type
+            expr.arguments[i] = self._expect(expr.arguments[i], tp)
+
+    @visitor.on('expect', ast.Method)
+    def _expect_method(self, expr: ast.Method, tar_type: types.Type) -> None:
+        # TODO: remove this duplicate code
+        if expr.match is None:
+            os = self.matches[expr]
+            match = self._resolve(os, tar_type, required=True)
+
+            expr.match = match
+            expr.expr_type = match.ret
+
+        # object
+        expr.object = self._expect(expr.object, expr.match.params[0].type)
+
+        # arguments
+        assert len(expr.arguments) == len(expr.match.params) - 1
+        for i in range(len(expr.arguments)):
+            tp = expr.match.params[i + 1].type
+            expr.arguments[i] = self._expect(expr.arguments[i], tp)
+
+    @visitor.on('expect', ast.Cast)
+    def _expect_cast(self, expr: ast.Cast, tar_type: types.Type) -> None:
+        if not isinstance(expr.match.source, symbols.Function):
+            raise error.AnalyzerError('cast not a function', expr)
+
+        expr.expr = self._expect(expr.expr, expr.match.params[0].type)
+
+    @visitor.on('expect', ast.Member)
+    def _expect_member(self, expr: ast.Member, tar_type: types.Type) -> None:
+        tp = types.Reference(types.remove_ref(expr.expr.expr_type))
+        expr.expr = self._expect(expr.expr, tp)
+
+    @visitor.on('expect', ast.Var, ast.Const)
+    def _expect_var_const(self, expr: ast.Expr, tar_type: types.Type) -> None:
+        # nothing to do
+        pass
+
+    @visitor.on('expect', ast.Assn)
+    def _expect_assn(self, expr: ast.Assn, tar_type: types.Type) -> None:
+        tp = types.deref(expr.variable.expr_type)
+
+        expr.variable = self._expect(expr.variable,
+                                     expr.variable.expr_type)
+        expr.value = self._expect(expr.value, tp)
+
+    @visitor.on('expect', ast.IncAssn)
+    def _expect_inc_assn(self,
+                         expr: ast.IncAssn,
+                         tar_type: types.Type) -> None:
+        if not isinstance(expr.match.source, symbols.Function):
+            raise error.AnalyzerError(
+                'incremental assignment not a function',
+                expr)
 
-        elif isinstance(expr, ast.Noop):
-            expr.expr_type = builtin.VOID
+        tp = types.Reference(expr.match.params[0].type)
+        expr.variable = self._expect(expr.variable, tp)
+        expr.value = self._expect(expr.value, expr.match.params[1].type)
 
-        else:
-            assert False, f'unknown expr type {expr}'
+    @visitor.on('expect', ast.Return)
+    def _expect_return(self, expr: ast.Return, tar_type: types.Type) -> None:
+        expr.value = self._expect(expr.value, expr.target.symbol.ret)
 
-    def _expect(self, expr: ast.Expr, tar_type: types.Type) -> ast.Expr:
-        if isinstance(expr, ast.Block):
-            for i in range(len(expr) - 1):
-                expr[i] = self._expect(expr[i], builtin.VOID)
+    @visitor.on('expect', ast.Break)
+    def _expect_break(self, expr: ast.Break, tar_type: types.Type) -> None:
+        expr.value = self._expect(expr.value, expr.target.expr_type)
 
-            expr[-1] = self._expect(expr[-1], tar_type)
+    @visitor.on('expect', ast.Continue, ast.Redo, ast.Noop)
+    def _expect_continue_redo_noop(self,
+                                   expr: ast.Expr,
+                                   tar_type: types.Type) -> None:
+        # nothing to do
+        pass
 
-            expr.expr_type = tar_type
+    def _cast(self, expr: ast.Expr, tar: types.Type) -> ast.Expr:
+        assert expr.expr_type is not None, f'{expr}.expr_type == None'
+        assert tar is not None
 
-        elif isinstance(expr, ast.Let):
-            if expr.value is not None:
-                expr.value = self._expect(expr.value, expr.symbol.type)
+        res = types.Resolution()
+        if res.accept_type(tar, expr.expr_type, False) is None:
+            raise error.AnalyzerError(
+                f'{expr.expr_type} cannot be converted to {tar}',
+                expr)
 
-        elif isinstance(expr, ast.If):
-            expr.condition = self._expect(expr.condition, builtin.BOOL)
-            expr.success = self._expect(expr.success, tar_type)
-            expr.failure = self._expect(expr.failure, tar_type)
+        tar = tar.resolve(res)
 
-            expr.expr_type = tar_type
+        # same, no need to cast
+        if expr.expr_type == tar:
+            return expr
 
-        elif isinstance(expr, ast.While):
-            expr.condition = self._expect(expr.condition, builtin.BOOL)
-            expr.content = self._expect(expr.content, builtin.VOID)
-            expr.failure = self._expect(expr.failure, tar_type)
+        # diverge will never reach the cast
+        if expr.expr_type == builtin.DIVERGE:
+            return expr
 
-            expr.expr_type = tar_type
+        # cast to void
+        if tar == builtin.VOID:
+            void = ast.Void(expr)
+            void.expr_type = builtin.VOID
+            void.copy_loc(expr)
+            return void
 
-        elif isinstance(expr, ast.Match):
-            # TODO: this is inefficient - level can be lowered when applicable
-            expr.expr = self._expect(expr.expr, expr.expr.expr_type)
-            for arm in expr.arms:
-                arm.content = self._expect(arm.content, tar_type)
+        # deref
+        while expr.expr_type != tar:
+            assert isinstance(expr.expr_type, types.Reference)
+            deref = ast.Deref(expr)
+            deref.expr_type = expr.expr_type.type
+            deref.copy_loc(expr)
+            expr = deref
 
-            expr.expr_type = tar_type
+        return expr
 
-        elif isinstance(expr, ast.BinTest):
-            expr.left = self._expect(expr.left, builtin.BOOL)
-            expr.right = self._expect(expr.right, builtin.BOOL)
 
-        elif isinstance(expr, ast.NotTest):
-            expr.expr = self._expect(expr.expr, builtin.BOOL)
+# analyzer, functions and shared objects of the parallel analysis, inherited
+# by the forked workers
+_job: Tuple[AnalyzeExpr, List[ast.Def], Dict[int, Any]] = None
 
-        elif isinstance(expr, (ast.Call, ast.Op)):
-            if expr.match is None:
-                os = self.matches[expr]
-                match = os.resolve(tar_type, required=True)
 
-                expr.match = match
-                expr.expr_type = match.ret
+def _shared(root: symbols.Module, defs: List[ast.Def]) -> Dict[int, Any]:
+    # objects that exist before the function bodies are analyzed; workers
+    # refer to them by id instead of sending back copies, which is valid
+    # since forked workers keep the same addresses
+    shared: Dict[int, Any] = {}
+    for decl in defs:
+        shared[id(decl)] = decl
+        shared[id(decl._source)] = decl._source
 
-            if isinstance(expr, ast.Op) and \
-                    not isinstance(expr.match.source, symbols.Function):
-                raise error.AnalyzerError('operator not a function', expr)
+    stack: List[Any] = [root, root.builtins]
+    while len(stack) > 0:
+        sym = stack.pop()
+        if sym is None or id(sym) in shared:
+            continue
 
-            assert len(expr.arguments) == len(expr.match.params)
-            for i in range(len(expr.arguments)):
-                tp = expr.match.params[i].type
-                expr.arguments[i] = self._expect(expr.arguments[i], tp)
+        shared[id(sym)] = sym
 
-        elif isinstance(expr, ast.Method):
-            # TODO: remove this duplicate code
-            if expr.match is None:
-                os = self.matches[expr]
-                match = os.resolve(tar_type, required=True)
+        if isinstance(sym, symbols.SymbolTable):
+            stack += sym.symbols.values()
+            stack += sym.references.values()
 
-                expr.match = match
-                expr.expr_type = match.ret
+        if isinstance(sym, symbols.Module):
+            stack.append(sym.builtins)
 
-            # object
-            expr.object = self._expect(expr.object, expr.match.params[0].type)
+        if isinstance(sym, symbols.FunctionGroup):
+            stack += sym.functions
 
-            # arguments
-            assert len(expr.arguments) == len(expr.match.params) - 1
-            for i in range(len(expr.arguments)):
-                tp = expr.match.params[i + 1].type
-                expr.arguments[i] = self._expect(expr.arguments[i], tp)
+    return shared
 
-        elif isinstance(expr, ast.Cast):
-            if not isinstance(expr.match.source, symbols.Function):
-                raise error.AnalyzerError('cast not a function', expr)
 
-            expr.expr = self._expect(expr.expr, expr.match.params[0].type)
+def _analyze_chunk(idx: range) -> bytes:
+    analyzer, defs, shared = _job
 
-        elif isinstance(expr, ast.Member):
-            tp = types.Reference(types.remove_ref(expr.expr.expr_type))
-            expr.expr = self._expect(expr.expr, tp)
+    analyzer.resolutions = 0
+    analyzer.overloads.hits = 0
+    analyzer.pruning.clear()
+    analyzer.instances.hits = 0
+    lookups = symbols.lookups.copy()
 
-        elif isinstance(expr, (ast.Var, ast.Const)):
-            # nothing to do, simply here so that the assert below works
-            pass
+    results: List[Tuple[str, Any]] = []
+    for i in idx:
+        decl = defs[i]
 
-        elif isinstance(expr, ast.Assn):
-            tp = types.deref(expr.variable.expr_type)
+        try:
+            analyzer._expr(decl.body, decl.symbol)
+        except Exception as e:
+            results.append(('update', _worker_error(e)))
+            continue
 
-            expr.variable = self._expect(expr.variable,
-                                         expr.variable.expr_type)
-            expr.value = self._expect(expr.value, tp)
+        try:
+            body = analyzer._expect(decl.body, decl.symbol.ret)
+        except Exception as e:
+            results.append(('expect', _worker_error(e)))
+            continue
 
-        elif isinstance(expr, ast.IncAssn):
-            if not isinstance(expr.match.source, symbols.Function):
-                raise error.AnalyzerError(
-                    'incremental assignment not a function',
-                    expr)
+        results.append((None, (body, decl.symbol.locals)))
 
-            tp = types.Reference(expr.match.params[0].type)
-            expr.variable = self._expect(expr.variable, tp)
-            expr.value = self._expect(expr.value, expr.match.params[1].type)
+    counts = (analyzer.resolutions,
+              analyzer.overloads.hits,
+              analyzer.pruning,
+              analyzer.instances.hits,
+              symbols.lookups - lookups)
 
-        elif isinstance(expr, ast.Return):
-            expr.value = self._expect(expr.value, expr.target.symbol.ret)
+    buf = io.BytesIO()
+    try:
+        _Pickler(buf, shared).dump((results, counts))
+    except Exception as e:
+        # the parent never sees any results of this chunk, so report the
+        # failure in place of the first one
+        return pickle.dumps(([('update', _worker_error(e))], counts))
 
-        elif isinstance(expr, ast.Break):
-            expr.value = self._expect(expr.value, expr.target.expr_type)
+    return buf.getvalue()
 
-        elif isinstance(expr, (ast.Continue, ast.Redo, ast.Noop)):
-            # nothing to do
-            pass
 
-        else:
-            assert False, f'unknown expr type {expr}'
+def _worker_error(e: Exception) -> Exception:
+    # errors are raised again by the parent, so they must survive pickling;
+    # anything else is reported with the traceback from the worker, since an
+    # exception that fails to unpickle would hang the pool
+    if isinstance(e, (error.CompilerError, error.SymbolError)):
+        return e
 
-        return self._cast(expr, tar_type)
+    return RuntimeError(f'in analysis worker:\n{traceback.format_exc()}')
 
-    def _cast(self, expr: ast.Expr, tar: types.Type) -> ast.Expr:
-        assert expr.expr_type is not None, f'{expr}.expr_type == None'
-        assert tar is not None
 
-        res = types.Resolution()
-        if res.accept_type(tar, expr.expr_type, False) is None:
-            raise error.AnalyzerError(
-                f'{expr.expr_type} cannot be converted to {tar}',
-                expr)
+class _Pickler(pickle.Pickler):
+    def __init__(self, file: io.BytesIO, shared: Dict[int, Any]) -> None:
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.shared = shared
 
-        tar = tar.resolve(res)
+        # only the classes of shared objects need to be checked, which is
+        # much cheaper than checking every object
+        self.dispatch_table = copyreg.dispatch_table.copy()
+        for cls in _subclasses(symbols.Symbol) + [ast.Def, tokens.Lines]:
+            self.dispatch_table[cls] = self._reduce
 
-        # same, no need to cast
-        if expr.expr_type == tar:
-            return expr
+    def _reduce(self, obj: Any) -> Any:
+        if id(obj) in self.shared:
+            return (_shared_object, (id(obj),))
 
-        # diverge will never reach the cast
-        if expr.expr_type == builtin.DIVERGE:
-            return expr
+        return obj.__reduce_ex__(pickle.HIGHEST_PROTOCOL)
 
-        # cast to void
-        if tar == builtin.VOID:
-            void = ast.Void(expr)
-            void.expr_type = builtin.VOID
-            void.set_loc(expr.start_token, expr.end_token)
-            return void
 
-        # deref
-        while expr.expr_type != tar:
-            assert isinstance(expr.expr_type, types.Reference)
-            deref = ast.Deref(expr)
-            deref.expr_type = expr.expr_type.type
-            deref.set_loc(expr.start_token, expr.end_token)
-            expr = deref
+def _shared_object(key: int) -> Any:
+    return _job[2][key]
 
-        return expr
+
+def _subclasses(cls: type) -> List[type]:
+    res = [cls]
+    for sub in cls.__subclasses__():
+        res += _subclasses(sub)
+
+    return res
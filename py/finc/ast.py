@@ -10,9 +10,14 @@ TNode = typing.TypeVar('TNode', bound='Node')
 
 
 class Node:
+    # the location is kept as the packed positions of the start and end
+    # tokens into the source lines of the file, and only turned back into
+    # tokens when needed
+    __slots__ = ['_source', '_span']
+
     def __init__(self) -> None:
-        self.start_token: tokens.Token = None
-        self.end_token: tokens.Token = None
+        self._source: tokens.Lines = None
+        self._span = 0
 
     def __str__(self) -> str:
         return type(self).__name__
@@ -23,9 +28,27 @@ class Node:
     def _detail(self) -> typing.List[object]:
         return [self.__class__.__name__]
 
+    @property
+    def start_token(self) -> tokens.Token:
+        if self._source is None:
+            return None
+
+        return tokens.unpack(self._source, self._span >> tokens.TOKEN_BITS)
+
+    @property
+    def end_token(self) -> tokens.Token:
+        if self._source is None:
+            return None
+
+        return tokens.unpack(self._source, self._span & tokens.TOKEN_MASK)
+
     def set_loc(self, start: tokens.Token, end: tokens.Token) -> None:
-        self.start_token = start
-        self.end_token = end
+        self._source = start.source
+        self._span = tokens.pack_span(start, end)
+
+    def copy_loc(self, other: 'Node') -> None:
+        self._source = other._source
+        self._span = other._span
 
     def children(self) -> typing.Iterable['Node']:
         raise NotImplementedError()
@@ -51,21 +74,29 @@ class Node:
 # --- base classes ---
 
 class Decl(Node):
+    __slots__ = []
+
     def children(self) -> typing.Iterable[Node]:
         raise NotImplementedError()
 
 
 class Type(Node):
+    __slots__ = []
+
     def children(self) -> typing.Iterable[Node]:
         raise NotImplementedError()
 
 
 class Pattern(Node):
+    __slots__ = []
+
     def children(self) -> typing.Iterable[Node]:
         raise NotImplementedError()
 
 
 class Expr(Node):
+    __slots__ = ['expr_type']
+
     def __init__(self) -> None:
         Node.__init__(self)
 
@@ -81,11 +112,14 @@ class Expr(Node):
         raise NotImplementedError()
 
 
-class List(typing.Generic[TNode], typing.Iterable[TNode], typing.Sized, Node):
-    def __init__(self, items: typing.List[TNode]) -> None:
-        Node.__init__(self)
+class Sequence(typing.Generic[TNode],
+               typing.Iterable[TNode],
+               typing.Sized,
+               Node):
+    # subclasses provide the `items` slot
+    __slots__ = []
 
-        self.items = items
+    items: typing.List[TNode]
 
     def __iter__(self) -> typing.Iterator[TNode]:
         return iter(self.items)
@@ -111,13 +145,24 @@ class List(typing.Generic[TNode], typing.Iterable[TNode], typing.Sized, Node):
         return self.items
 
 
+class List(Sequence[TNode]):
+    __slots__ = ['items']
+
+    def __init__(self, items: typing.List[TNode]) -> None:
+        Node.__init__(self)
+
+        self.items = items
+
+
 # --- basic classes ---
 
 class File(List[Decl]):
-    pass
+    __slots__ = []
 
 
 class Path(Node):
+    __slots__ = ['path', 'name']
+
     def __init__(self,
                  path: 'Path',
                  name: str) -> None:
@@ -134,6 +179,8 @@ class Path(Node):
 
 
 class Generic(Node):
+    __slots__ = ['name']
+
     def __init__(self,
                  name: str) -> None:
         Node.__init__(self)
@@ -148,6 +195,8 @@ class Generic(Node):
 
 
 class Param(Node):
+    __slots__ = ['name', 'type']
+
     def __init__(self,
                  name: str,
                  tp: Type) -> None:
@@ -164,6 +213,8 @@ class Param(Node):
 
 
 class Field(Node):
+    __slots__ = ['name', 'type']
+
     def __init__(self,
                  name: str,
                  tp: Type) -> None:
@@ -180,6 +231,8 @@ class Field(Node):
 
 
 class Arm(Node):
+    __slots__ = ['pattern', 'content', 'target', 'pat']
+
     def __init__(self,
                  pat: Pattern,
                  cont: Expr) -> None:
@@ -199,6 +252,8 @@ class Arm(Node):
 
 
 class Variant(Node):
+    __slots__ = ['name', 'fields']
+
     def __init__(self,
                  name: str,
                  flds: List[Field]) -> None:
@@ -217,6 +272,8 @@ class Variant(Node):
 # --- declaration nodes ---
 
 class Import(Decl):
+    __slots__ = ['path']
+
     def __init__(self,
                  path: Path) -> None:
         Decl.__init__(self)
@@ -228,6 +285,15 @@ class Import(Decl):
 
 
 class Def(Decl):
+    __slots__ = [
+        'name',
+        'generics',
+        'parameters',
+        'return_type',
+        'body',
+        'symbol',
+    ]
+
     def __init__(self,
                  name: str,
                  gens: List[Generic],
@@ -266,6 +332,8 @@ class Def(Decl):
 
 
 class Struct(Decl):
+    __slots__ = ['name', 'generics', 'fields', 'symbol']
+
     def __init__(self,
                  name: str,
                  gens: List[Generic],
@@ -290,6 +358,8 @@ class Struct(Decl):
 
 
 class Enum(Decl):
+    __slots__ = ['name', 'generics', 'variants', 'symbol']
+
     def __init__(self,
                  name: str,
                  gens: List[Generic],
@@ -316,6 +386,8 @@ class Enum(Decl):
 # --- type nodes ---
 
 class TypeRef(Type):
+    __slots__ = ['type']
+
     def __init__(self,
                  tp: Type) -> None:
         Type.__init__(self)
@@ -327,6 +399,8 @@ class TypeRef(Type):
 
 
 class TypeArray(Type):
+    __slots__ = ['type', 'length']
+
     def __init__(self,
                  tp: Type,
                  leng: 'Const') -> None:
@@ -340,6 +414,8 @@ class TypeArray(Type):
 
 
 class TypeNamed(Type):
+    __slots__ = ['path', 'generics']
+
     def __init__(self,
                  path: Path,
                  gens: List[Type]) -> None:
@@ -355,11 +431,15 @@ class TypeNamed(Type):
 # --- pattern nodes ---
 
 class PatternAny(Pattern):
+    __slots__ = []
+
     def children(self) -> typing.Iterable[Node]:
         return []
 
 
 class PatternConst(Pattern):
+    __slots__ = ['value', 'type']
+
     def __init__(self,
                  val: str,
                  tp: str) -> None:
@@ -376,6 +456,8 @@ class PatternConst(Pattern):
 
 
 class PatternVar(Pattern):
+    __slots__ = ['name']
+
     def __init__(self,
                  name: str) -> None:
         Pattern.__init__(self)
@@ -390,6 +472,8 @@ class PatternVar(Pattern):
 
 
 class PatternCall(Pattern):
+    __slots__ = ['path', 'fields']
+
     def __init__(self,
                  path: Path,
                  flds: List[Pattern]) -> None:
@@ -404,18 +488,22 @@ class PatternCall(Pattern):
 
 # --- expr nodes ---
 
-class Block(Expr, List[Expr]):
+class Block(Expr, Sequence[Expr]):
+    __slots__ = ['items', 'block']
+
     def __init__(self, items: typing.List[Expr]) -> None:
         Expr.__init__(self)
-        List[Expr].__init__(self, items)
 
+        self.items = items
         self.block: symbols.Block = None
 
     def children(self) -> typing.Iterable[Node]:
-        return List.children(self)
+        return Sequence.children(self)
 
 
 class Let(Expr):
+    __slots__ = ['name', 'type', 'value', 'symbol']
+
     def __init__(self,
                  name: str,
                  tp: Type,
@@ -436,6 +524,8 @@ class Let(Expr):
 
 
 class If(Expr):
+    __slots__ = ['condition', 'success', 'failure']
+
     def __init__(self,
                  cond: Expr,
                  succ: Expr,
@@ -451,6 +541,8 @@ class If(Expr):
 
 
 class While(Expr):
+    __slots__ = ['condition', 'content', 'failure', 'breaks']
+
     def __init__(self,
                  cond: Expr,
                  cont: Expr,
@@ -461,11 +553,16 @@ class While(Expr):
         self.content = cont
         self.failure = fail
 
+        # breaks targeting this loop
+        self.breaks: typing.List[Break] = []
+
     def children(self) -> typing.Iterable[Node]:
         return [self.condition, self.content, self.failure]
 
 
 class Match(Expr):
+    __slots__ = ['expr', 'arms']
+
     def __init__(self,
                  expr: Expr,
                  arms: List[Arm]) -> None:
@@ -479,6 +576,8 @@ class Match(Expr):
 
 
 class BinTest(Expr):
+    __slots__ = ['left', 'operator', 'right']
+
     def __init__(self,
                  left: Expr,
                  op: str,
@@ -497,6 +596,8 @@ class BinTest(Expr):
 
 
 class NotTest(Expr):
+    __slots__ = ['expr']
+
     def __init__(self,
                  expr: Expr) -> None:
         Expr.__init__(self)
@@ -508,6 +609,8 @@ class NotTest(Expr):
 
 
 class Call(Expr):
+    __slots__ = ['path', 'arguments', 'match']
+
     def __init__(self,
                  path: Path,
                  args: List[Expr]) -> None:
@@ -526,6 +629,8 @@ class Call(Expr):
 
 
 class Method(Expr):
+    __slots__ = ['object', 'path', 'arguments', 'match']
+
     def __init__(self,
                  obj: Expr,
                  path: Path,
@@ -546,6 +651,8 @@ class Method(Expr):
 
 
 class Op(Expr):
+    __slots__ = ['operator', 'arguments', 'match']
+
     def __init__(self,
                  op: str,
                  args: List[Expr]) -> None:
@@ -564,6 +671,8 @@ class Op(Expr):
 
 
 class Cast(Expr):
+    __slots__ = ['expr', 'type', 'match']
+
     def __init__(self,
                  expr: Expr,
                  tp: Type) -> None:
@@ -582,6 +691,8 @@ class Cast(Expr):
 
 
 class Member(Expr):
+    __slots__ = ['expr', 'member']
+
     def __init__(self,
                  expr: Expr,
                  mem: Path) -> None:
@@ -595,6 +706,8 @@ class Member(Expr):
 
 
 class Var(Expr):
+    __slots__ = ['path', 'variable']
+
     def __init__(self,
                  path: Path) -> None:
         Expr.__init__(self)
@@ -611,6 +724,8 @@ class Var(Expr):
 
 
 class Const(Expr):
+    __slots__ = ['value', 'type']
+
     def __init__(self,
                  val: str,
                  tp: str) -> None:
@@ -627,6 +742,8 @@ class Const(Expr):
 
 
 class Assn(Expr):
+    __slots__ = ['variable', 'value']
+
     def __init__(self,
                  var: Expr,
                  val: Expr) -> None:
@@ -640,6 +757,8 @@ class Assn(Expr):
 
 
 class IncAssn(Expr):
+    __slots__ = ['variable', 'operator', 'value', 'match']
+
     def __init__(self,
                  var: Expr,
                  op: str,
@@ -660,6 +779,8 @@ class IncAssn(Expr):
 
 
 class Return(Expr):
+    __slots__ = ['value', 'target']
+
     def __init__(self,
                  val: Expr) -> None:
         Expr.__init__(self)
@@ -676,6 +797,8 @@ class Return(Expr):
 
 
 class Break(Expr):
+    __slots__ = ['value', 'target']
+
     def __init__(self,
                  val: Expr) -> None:
         Expr.__init__(self)
@@ -692,6 +815,8 @@ class Break(Expr):
 
 
 class Continue(Expr):
+    __slots__ = ['target']
+
     def __init__(self) -> None:
         Expr.__init__(self)
 
@@ -705,6 +830,8 @@ class Continue(Expr):
 
 
 class Redo(Expr):
+    __slots__ = ['target']
+
     def __init__(self) -> None:
         Expr.__init__(self)
 
@@ -715,6 +842,8 @@ class Redo(Expr):
 
 
 class Noop(Expr):
+    __slots__ = []
+
     def children(self) -> typing.Iterable[Node]:
         return []
 
@@ -722,6 +851,8 @@ class Noop(Expr):
 # --- analyzer nodes ---
 
 class Deref(Expr):
+    __slots__ = ['expr']
+
     def __init__(self, expr: Expr) -> None:
         Expr.__init__(self)
 
@@ -732,6 +863,8 @@ class Deref(Expr):
 
 
 class Void(Expr):
+    __slots__ = ['expr']
+
     def __init__(self, expr: Expr) -> None:
         Expr.__init__(self)
 
@@ -0,0 +1,144 @@
+from typing import Callable, Optional, TypeVar
+from collections import Counter
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+
+
+# bump whenever the layout of a cached table changes
+VERSION = 1
+
+T = TypeVar('T')
+
+
+def directory() -> Path:
+    if 'FINC_CACHE_DIR' in os.environ:
+        return Path(os.environ['FINC_CACHE_DIR'])
+
+    if 'XDG_CACHE_HOME' in os.environ:
+        return Path(os.environ['XDG_CACHE_HOME']) / 'finc'
+
+    return Path.home() / '.cache' / 'finc'
+
+
+def enabled() -> bool:
+    return os.environ.get('FINC_NO_CACHE', '') == ''
+
+
+def digest(source: Path) -> str:
+    with source.open('rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load(kind: str, source: Path, build: Callable[[], T]) -> T:
+    if not enabled():
+        return build()
+
+    # the module defining the builder is part of the key as well, so that
+    # changes to how the value is built are picked up
+    builder = Path(sys.modules[build.__module__].__file__)
+    key = hashlib.sha256(
+        f'{digest(source)}:{digest(builder)}'.encode()).hexdigest()
+    path = directory() / f'{kind}-{VERSION}-{key}.pickle'
+
+    try:
+        with path.open('rb') as f:
+            return pickle.load(f)
+    except Exception:
+        # missing, corrupt or unloadable entries are simply rebuilt
+        pass
+
+    value = build()
+    store(path, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    return value
+
+
+def store(path: Path, data: bytes) -> None:
+    # write to a temporary file first so that concurrent compilers never see
+    # a partially written entry
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix='.tmp')
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+
+        os.replace(tmp, str(path))
+    except OSError:
+        os.unlink(tmp)
+
+
+class BuildCache:
+    # compiled modules keyed by everything that affects their output, with
+    # the least recently used entries evicted above `limit` bytes
+
+    def __init__(self, limit: int) -> None:
+        self.path = directory() / 'build'
+        self.limit = limit
+        self.stats = Counter()
+
+    def key(self, *parts: str) -> str:
+        h = hashlib.sha256(str(VERSION).encode())
+        for part in parts:
+            h.update(b'\0')
+            h.update(part.encode())
+
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.path / f'{key}.fm'
+
+        try:
+            with path.open('rb') as f:
+                data = f.read()
+
+            # mark as recently used
+            os.utime(str(path))
+        except OSError:
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        store(self.path / f'{key}.fm', data)
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        size = 0
+
+        try:
+            for path in self.path.glob('*.fm'):
+                st = path.stat()
+                entries.append((st.st_mtime, path, st.st_size))
+                size += st.st_size
+        except OSError:
+            # other processes may be evicting at the same time
+            return
+
+        entries.sort()
+        for _, path, entry_size in entries:
+            if size <= self.limit:
+                break
+
+            try:
+                path.unlink()
+                self.stats['evictions'] += 1
+            except OSError:
+                pass
+
+            size -= entry_size
+
+
+def report(stats: Counter) -> str:
+    return (f"build cache: {stats['hits']} hits, "
+            f"{stats['misses']} misses, "
+            f"{stats['evictions']} evictions")
@@ -1,3 +1,4 @@
+from typing import Any
 from . import ast
 from . import tokens
 from . import symbols
@@ -59,6 +60,10 @@ class AnalyzerError(CompilerError):
         self.node = node
         self.symbol = sym
 
+    def __reduce__(self) -> Any:
+        return (AnalyzerError,
+                (Exception.__str__(self), self.node, self.symbol))
+
 
 class SymbolError(Exception):
     def __init__(self, msg: str, sym: 'symbols.Symbol') -> None:
@@ -66,7 +71,15 @@ class SymbolError(Exception):
 
         self.symbol = sym
 
+    def __reduce__(self) -> Any:
+        return (SymbolError, (Exception.__str__(self), self.symbol))
+
 
 class AssemblerError(Exception):
     def __init__(self, msg: str, ins: 'instr.Instr') -> None:
         Exception.__init__(self, msg)
+
+        self.instr = ins
+
+    def detail(self) -> str:
+        return f'{self}\n  in instruction: {str(self.instr).strip()}'
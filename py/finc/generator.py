@@ -1,10 +1,12 @@
-from typing import Dict, Set, List, Union, Any, Sequence, Iterable, Iterator
+from typing import Dict, Set, List, Union, Any, Sequence, Iterable, Iterator, \
+    Hashable
 from . import builtin
 from . import symbols
 from . import types
 from . import pattern
 from . import ast
 from . import instr
+from . import visitor
 
 
 OP_TABLE = {
@@ -32,9 +34,9 @@ class Writer(Iterable[instr.Instr]):
     def __iter__(self) -> Iterator[instr.Instr]:
         return iter(self._instrs)
 
-    def _write(self, tokens: Sequence[str]) -> None:
+    def _write(self, opname: str, args: Sequence[Any]) -> None:
         # TODO: line content
-        ins = instr.Instr(tokens, self._indent)
+        ins = instr.Instr(opname, args, self._indent)
         self._instrs.append(ins)
 
     def indent(self) -> None:
@@ -43,17 +45,18 @@ class Writer(Iterable[instr.Instr]):
     def dedent(self) -> None:
         self._indent -= 1
 
-    def instr(self, *args: str) -> None:
-        self._write(args)
+    def instr(self, opname: str, *args: Any) -> None:
+        self._write(opname, args)
 
-    def comment(self, val: object) -> None:
-        self._write([f'# {val}'])
+    def comment(self, fmt: str, *args: object) -> None:
+        # only formatted when printed
+        self._write(instr.COMMENT, (fmt,) + args)
 
     def label(self, label: str) -> None:
-        self._write([f'{label}:'])
+        self._write(instr.LABEL, (label,))
 
     def space(self) -> None:
-        self._write([])
+        self._write(instr.SPACE, ())
 
     def extend(self, writer: 'Writer') -> None:
         self._instrs.extend(writer._instrs)
@@ -66,10 +69,11 @@ class Writer(Iterable[instr.Instr]):
             assert tp.length is not None
 
             self.type(tp.type)
-            self.instr('size_arr', str(tp.length))
+            self.instr('size_arr', tp.length)
 
         elif isinstance(tp, types.Generic):
-            self.instr('size_dup', str(tp.symbol.index))
+            # named like the sizes of generics are declared
+            self.instr('size_dup', tp.fullname())
 
         elif isinstance(tp, types.Special):
             assert False, 'when?'
@@ -179,13 +183,19 @@ class Generator:
         self._labels: Dict[str, int] = None
         self._function_refs: Set[symbols.Function] = None
         self._type_refs: Dict[str, SymbolRef] = None
+        self._names: Dict[Hashable, str] = None
 
     def generate(self,
                  root: ast.Node,
-                 mod: symbols.Module) -> Iterable[instr.Instr]:
+                 mod: symbols.Module,
+                 instances: types.Instantiations = None
+                 ) -> Iterable[instr.Instr]:
         self._root = root
         self._module = mod
 
+        # names are shared with the instantiations of the compilation
+        self._names = instances.names if instances is not None else {}
+
         self._labels = {}
         self._function_refs = set()
         self._type_refs = {}
@@ -230,6 +240,26 @@ class Generator:
 
         return writer
 
+    def type_name(self, tp: types.Type) -> str:
+        # types are interned, so they can be used as keys
+        name = self._names.get(tp, None)
+        if name is None:
+            name = type_name(tp)
+            self._names[tp] = name
+
+        return name
+
+    def match_name(self, match: types.Match) -> str:
+        if match.instance is None:
+            return match_name(match)
+
+        name = self._names.get(match.instance, None)
+        if name is None:
+            name = match_name(match)
+            self._names[match.instance] = name
+
+        return name
+
     def label(self, name: str) -> str:
         count = self._labels.get(name, 0)
         self._labels[name] = count + 1
@@ -265,6 +295,7 @@ class Type:
                  gen: Generator,
                  sym: Union[symbols.Struct, symbols.Enumeration],
                  writer: Writer) -> None:
+        self.gen = gen
         self.types: Dict[str, types.Type] = {}
 
         writer.indent()
@@ -277,8 +308,8 @@ class Type:
         name = sym.basename()
         gens = len(sym.generics)
 
-        writer.comment(str(sym))
-        writer.instr('type', quote(name), str(gens), end)
+        writer.comment('{}', sym)
+        writer.instr('type', quote(name), gens, end)
 
         writer.indent()
 
@@ -346,14 +377,14 @@ class Type:
             assert False
 
     def _type(self, tp: types.Type) -> str:
-        name = type_name(tp)
+        name = self.gen.type_name(tp)
         if not isinstance(tp, types.Generic):
             self.types.setdefault(name, tp)
 
         return name
 
 
-class Function:
+class Function(visitor.Visitor):
     def __init__(self,
                  gen: Generator,
                  node: ast.Def,
@@ -386,8 +417,8 @@ class Function:
         begin = self.gen.label('BEGIN_FN')
         end = self.gen.label('END_FN')
 
-        writer.comment(node)
-        writer.instr('fn', quote(name), str(gens), str(ctrs), begin, end)
+        writer.comment('{}', node)
+        writer.instr('fn', quote(name), gens, ctrs, begin, end)
 
         writer.indent()
 
@@ -430,7 +461,7 @@ class Function:
         writer.comment('params')
         for param in node.symbol.params:
             writer.instr('!off', var_name(param))
-            writer.instr('param', type_name(param.type))
+            writer.instr('param', self.gen.type_name(param.type))
             writer.space()
 
         writer.space()
@@ -456,7 +487,7 @@ class Function:
                 writer.instr('reset', reset_target)
 
             writer.instr('!off', child.name)
-            writer.instr('local', type_name(child.type))
+            writer.instr('local', self.gen.type_name(child.type))
             writer.space()
 
             self._write_local(writer, child)
@@ -467,11 +498,11 @@ class Function:
         return temp
 
     def _gen(self, node: ast.Expr, stk: TypeList) -> TypeList:
-        self.writer.comment(repr(node))
+        self.writer.comment('{!r}', node)
 
         self.writer.indent()
 
-        self._expr(node, stk)
+        self.visit('expr', node, stk)
         if node.expr_type != builtin.VOID and \
                 node.expr_type != builtin.DIVERGE:
             stk = stk.push(node.expr_type)
@@ -481,7 +512,7 @@ class Function:
         return stk
 
     def _type(self, tp: types.Type) -> str:
-        name = type_name(tp)
+        name = self.gen.type_name(tp)
         if name not in self.types and not isinstance(tp, types.Generic):
             self.types[name] = TypeRef(tp)
 
@@ -491,7 +522,7 @@ class Function:
         assert isinstance(match.source, symbols.Function)
         self.gen.ref_function(match.source)
 
-        name = match_name(match)
+        name = self.gen.match_name(match)
         self.contracts.setdefault(name, match)
 
         return name
@@ -560,7 +591,7 @@ class Function:
         self.writer.instr(f'{op}_{name}')
 
     def _match(self, pat: pattern.Pattern, tp: types.Type, nxt: str) -> None:
-        self.writer.comment(f'match {pat}')
+        self.writer.comment('match {}', pat)
 
         self.writer.indent()
 
@@ -577,10 +608,10 @@ class Function:
 
         elif isinstance(pat, pattern.Constant):
             if pat.type == builtin.INT:
-                self.writer.instr('const_i', str(pat.value))
+                self.writer.instr('const_i', int(pat.value, 0))
                 self.writer.instr('eq_i')
             elif pat.type == builtin.FLOAT:
-                self.writer.instr('const_f', str(pat.value))
+                self.writer.instr('const_f', float(pat.value))
                 self.writer.instr('eq_f')
             else:
                 assert False, f'unknown const pattern type {pat.type}'
@@ -601,7 +632,7 @@ class Function:
                 self.writer.instr('load_mem',
                                   self._member(pat.type, '_value'),
                                   self._type(builtin.INT))
-                self.writer.instr('const_i', str(pat.source.value))
+                self.writer.instr('const_i', pat.source.value)
                 self.writer.instr('eq_i')
                 self.writer.instr('br_false', nxt)
                 self.writer.space()
@@ -625,298 +656,317 @@ class Function:
 
         self.writer.dedent()
 
-    def _expr(self, expr: ast.Expr, stk: TypeList) -> None:
-        if isinstance(expr, ast.Block):
-            for child in expr:
-                stk = self._gen(child, stk)
-                self.writer.space()
-
-            for loc in expr.block.locals:
-                self._pop_local(var_name(loc))
+    @visitor.on('expr', ast.Block)
+    def _expr_block(self, expr: ast.Block, stk: TypeList) -> None:
+        for child in expr:
+            stk = self._gen(child, stk)
+            self.writer.space()
 
-        elif isinstance(expr, ast.Let):
-            assert isinstance(expr.symbol, symbols.Variable)
+        for loc in expr.block.locals:
+            self._pop_local(var_name(loc))
 
-            self._push_local(var_name(expr.symbol), expr.symbol.type)
-            if expr.value is not None:
-                self._gen(expr.value, stk)
-                self.writer.instr('store_var',
-                                  var_name(expr.symbol),
-                                  self._type(expr.symbol.type))
+    @visitor.on('expr', ast.Let)
+    def _expr_let(self, expr: ast.Let, stk: TypeList) -> None:
+        assert isinstance(expr.symbol, symbols.Variable)
 
-        elif isinstance(expr, ast.If):
-            els = self.gen.label('ELSE')
-            end = self.gen.label('END_IF')
-            has_else = not isinstance(expr.failure, ast.Noop)
+        self._push_local(var_name(expr.symbol), expr.symbol.type)
+        if expr.value is not None:
+            self._gen(expr.value, stk)
+            self.writer.instr('store_var',
+                              var_name(expr.symbol),
+                              self._type(expr.symbol.type))
 
-            self._gen(expr.condition, stk)
-            self.writer.instr('br_false', els if has_else else end)
-            self._gen(expr.success, stk)
+    @visitor.on('expr', ast.If)
+    def _expr_if(self, expr: ast.If, stk: TypeList) -> None:
+        els = self.gen.label('ELSE')
+        end = self.gen.label('END_IF')
+        has_else = not isinstance(expr.failure, ast.Noop)
 
-            if has_else:
-                self.writer.instr('br', end)
-                self.writer.label(els)
-                self._gen(expr.failure, stk)
+        self._gen(expr.condition, stk)
+        self.writer.instr('br_false', els if has_else else end)
+        self._gen(expr.success, stk)
 
-            self.writer.label(end)
+        if has_else:
+            self.writer.instr('br', end)
+            self.writer.label(els)
+            self._gen(expr.failure, stk)
 
-        elif isinstance(expr, ast.While):
-            start = self.gen.label('WHILE')
-            cond = self.gen.label('COND')
-            end = self.gen.label('END_WHILE')
+        self.writer.label(end)
 
-            self._context[expr] = {
-                'break': end,
-                'continue': cond,
-                'redo': start,
-                'before': stk,
-                'after': stk.push(expr.expr_type)
-            }
+    @visitor.on('expr', ast.While)
+    def _expr_while(self, expr: ast.While, stk: TypeList) -> None:
+        start = self.gen.label('WHILE')
+        cond = self.gen.label('COND')
+        end = self.gen.label('END_WHILE')
 
-            self.writer.instr('br', cond)
+        self._context[expr] = {
+            'break': end,
+            'continue': cond,
+            'redo': start,
+            'before': stk,
+            'after': stk.push(expr.expr_type)
+        }
 
-            self.writer.label(start)
-            self._gen(expr.content, stk)
+        self.writer.instr('br', cond)
 
-            self.writer.label(cond)
-            self._gen(expr.condition, stk)
-            self.writer.instr('br_true', start)
+        self.writer.label(start)
+        self._gen(expr.content, stk)
 
-            self._gen(expr.failure, stk)
-            self.writer.label(end)
+        self.writer.label(cond)
+        self._gen(expr.condition, stk)
+        self.writer.instr('br_true', start)
 
-        elif isinstance(expr, ast.Match):
-            end = self.gen.label('END_MATCH')
+        self._gen(expr.failure, stk)
+        self.writer.label(end)
 
-            self._gen(expr.expr, stk)
+    @visitor.on('expr', ast.Match)
+    def _expr_match(self, expr: ast.Match, stk: TypeList) -> None:
+        end = self.gen.label('END_MATCH')
 
-            for arm in expr.arms:
-                nxt = self.gen.label('ARM')
+        self._gen(expr.expr, stk)
 
-                for var in arm.pat.variables():
-                    self._push_local(var_name(var.variable), var.variable.type)
+        for arm in expr.arms:
+            nxt = self.gen.label('ARM')
 
-                if arm.pat.tested() or arm.pat.bound():
-                    self.writer.instr('dup', self._type(expr.expr.expr_type))
-                    self._match(arm.pat, expr.expr.expr_type, nxt)
+            for var in arm.pat.variables():
+                self._push_local(var_name(var.variable), var.variable.type)
 
-                self.writer.instr('pop', self._type(expr.expr.expr_type))
+            if arm.pat.tested() or arm.pat.bound():
+                self.writer.instr('dup', self._type(expr.expr.expr_type))
+                self._match(arm.pat, expr.expr.expr_type, nxt)
 
-                self._gen(arm.content, stk)
+            self.writer.instr('pop', self._type(expr.expr.expr_type))
 
-                for var in arm.pat.variables():
-                    self._pop_local(var_name(var.variable))
+            self._gen(arm.content, stk)
 
-                self.writer.instr('br', end)
-                self.writer.label(nxt)
+            for var in arm.pat.variables():
+                self._pop_local(var_name(var.variable))
 
-            # abort when no match found
-            self.writer.instr('error')
+            self.writer.instr('br', end)
+            self.writer.label(nxt)
 
-            self.writer.label(end)
+        # abort when no match found
+        self.writer.instr('error')
 
-        elif isinstance(expr, ast.BinTest):
-            jump = self.gen.label('SHORT_CIRCUIT')
-            end = self.gen.label('END_TEST')
+        self.writer.label(end)
 
-            self._gen(expr.left, stk)
+    @visitor.on('expr', ast.BinTest)
+    def _expr_bin_test(self, expr: ast.BinTest, stk: TypeList) -> None:
+        jump = self.gen.label('SHORT_CIRCUIT')
+        end = self.gen.label('END_TEST')
 
-            if expr.operator == 'and':
-                self.writer.instr('br_false', jump)
-            elif expr.operator == 'or':
-                self.writer.instr('br_true', jump)
-            else:
-                assert False, 'unknown binary test type'
+        self._gen(expr.left, stk)
 
-            self._gen(expr.right, stk)
-            self.writer.instr('br', end)
-            self.writer.label(jump)
+        if expr.operator == 'and':
+            self.writer.instr('br_false', jump)
+        elif expr.operator == 'or':
+            self.writer.instr('br_true', jump)
+        else:
+            assert False, 'unknown binary test type'
 
-            if expr.operator == 'and':
-                self.writer.instr('const_false')
-            elif expr.operator == 'or':
-                self.writer.instr('const_true')
-            else:
-                assert False, 'unknown binary test type'
+        self._gen(expr.right, stk)
+        self.writer.instr('br', end)
+        self.writer.label(jump)
 
-            self.writer.label(end)
+        if expr.operator == 'and':
+            self.writer.instr('const_false')
+        elif expr.operator == 'or':
+            self.writer.instr('const_true')
+        else:
+            assert False, 'unknown binary test type'
 
-        elif isinstance(expr, ast.NotTest):
-            self._gen(expr.expr, stk)
-            self.writer.instr('not')
+        self.writer.label(end)
 
-        elif isinstance(expr, ast.Call):
-            sym = expr.match.source
+    @visitor.on('expr', ast.NotTest)
+    def _expr_not_test(self, expr: ast.NotTest, stk: TypeList) -> None:
+        self._gen(expr.expr, stk)
+        self.writer.instr('not')
 
-            if isinstance(sym, symbols.Function):
-                for child in expr.arguments:
-                    stk = self._gen(child, stk)
+    @visitor.on('expr', ast.Call)
+    def _expr_call(self, expr: ast.Call, stk: TypeList) -> None:
+        sym = expr.match.source
 
-                self._call(expr.match)
+        if isinstance(sym, symbols.Function):
+            for child in expr.arguments:
+                stk = self._gen(child, stk)
 
-            elif isinstance(sym, (symbols.Struct, symbols.Variant)):
-                tmp = self._temp()
+            self._call(expr.match)
 
-                tp = expr.match.ret
-                self._push_local(tmp, tp)
+        elif isinstance(sym, (symbols.Struct, symbols.Variant)):
+            tmp = self._temp()
 
-                assert isinstance(tp, (types.StructType,
-                                       types.EnumerationType))
+            tp = expr.match.ret
+            self._push_local(tmp, tp)
 
-                if isinstance(sym, symbols.Variant):
-                    self.writer.instr('addr_var', tmp)
-                    # TODO: user-defined value type
-                    self.writer.instr('const_i', str(sym.value))
-                    self.writer.instr('store_mem',
-                                      self._member(tp, '_value'),
-                                      self._type(builtin.INT))
+            assert isinstance(tp, (types.StructType,
+                                   types.EnumerationType))
 
-                # silence type checker
-                assert isinstance(sym, (symbols.Struct, symbols.Variant))
+            if isinstance(sym, symbols.Variant):
+                self.writer.instr('addr_var', tmp)
+                # TODO: user-defined value type
+                self.writer.instr('const_i', sym.value)
+                self.writer.instr('store_mem',
+                                  self._member(tp, '_value'),
+                                  self._type(builtin.INT))
 
-                assert len(expr.arguments) == len(sym.fields)
-                for child, field in zip(expr.arguments, sym.fields):
-                    self.writer.instr('addr_var', tmp)
-                    self._gen(child, stk)
-                    self.writer.instr('store_mem',
-                                      self._member(tp, field.name),
-                                      self._type(child.expr_type))
+            # silence type checker
+            assert isinstance(sym, (symbols.Struct, symbols.Variant))
 
-                self.writer.instr('load_var', tmp, self._type(tp))
-                self._pop_local(tmp)
+            assert len(expr.arguments) == len(sym.fields)
+            for child, field in zip(expr.arguments, sym.fields):
+                self.writer.instr('addr_var', tmp)
+                self._gen(child, stk)
+                self.writer.instr('store_mem',
+                                  self._member(tp, field.name),
+                                  self._type(child.expr_type))
 
-            else:
-                assert False, 'unknown match source type'
+            self.writer.instr('load_var', tmp, self._type(tp))
+            self._pop_local(tmp)
 
-        elif isinstance(expr, ast.Method):
-            stk = self._gen(expr.object, stk)
+        else:
+            assert False, 'unknown match source type'
 
-            for child in expr.arguments:
-                stk = self._gen(child, stk)
+    @visitor.on('expr', ast.Method)
+    def _expr_method(self, expr: ast.Method, stk: TypeList) -> None:
+        stk = self._gen(expr.object, stk)
 
-            self._call(expr.match)
+        for child in expr.arguments:
+            stk = self._gen(child, stk)
 
-        elif isinstance(expr, ast.Op):
-            for child in expr.arguments:
-                stk = self._gen(child, stk)
+        self._call(expr.match)
 
-            self._call(expr.match)
+    @visitor.on('expr', ast.Op)
+    def _expr_op(self, expr: ast.Op, stk: TypeList) -> None:
+        for child in expr.arguments:
+            stk = self._gen(child, stk)
 
-        elif isinstance(expr, ast.Cast):
-            self._gen(expr.expr, stk)
-            self._call(expr.match)
+        self._call(expr.match)
 
-        elif isinstance(expr, ast.Member):
-            self._gen(expr.expr, stk)
+    @visitor.on('expr', ast.Cast)
+    def _expr_cast(self, expr: ast.Cast, stk: TypeList) -> None:
+        self._gen(expr.expr, stk)
+        self._call(expr.match)
 
-            assert expr.member.path is None, 'member path not implemented'
+    @visitor.on('expr', ast.Member)
+    def _expr_member(self, expr: ast.Member, stk: TypeList) -> None:
+        self._gen(expr.expr, stk)
 
-            tp = expr.expr.expr_type
-            mem = expr.member.name
-            self.writer.instr('addr_mem', self._member(tp, mem))
+        assert expr.member.path is None, 'member path not implemented'
 
-        elif isinstance(expr, ast.Var):
-            if isinstance(expr.variable, symbols.Constant):
-                tp = expr.variable.type
-                if not isinstance(tp, types.StructType):
-                    raise NotImplementedError()
+        tp = expr.expr.expr_type
+        mem = expr.member.name
+        self.writer.instr('addr_mem', self._member(tp, mem))
 
-                if isinstance(expr.variable.value, bool):
-                    if expr.variable.value:
-                        self.writer.instr('const_true')
-                    else:
-                        self.writer.instr('const_false')
-                else:
-                    raise NotImplementedError()
+    @visitor.on('expr', ast.Var)
+    def _expr_var(self, expr: ast.Var, stk: TypeList) -> None:
+        if isinstance(expr.variable, symbols.Constant):
+            tp = expr.variable.type
+            if not isinstance(tp, types.StructType):
+                raise NotImplementedError()
 
-            elif isinstance(expr.variable, symbols.Variable):
-                if expr.variable.is_arg:
-                    self.writer.instr('addr_arg', var_name(expr.variable))
+            if isinstance(expr.variable.value, bool):
+                if expr.variable.value:
+                    self.writer.instr('const_true')
                 else:
-                    self.writer.instr('addr_var', var_name(expr.variable))
-
+                    self.writer.instr('const_false')
             else:
-                assert False, 'unknown var type'
+                raise NotImplementedError()
 
-        elif isinstance(expr, ast.Const):
-            if expr.type == 'num':
-                self.writer.instr('const_i', expr.value)
-            elif expr.type == 'float':
-                self.writer.instr('const_f', expr.value)
+        elif isinstance(expr.variable, symbols.Variable):
+            if expr.variable.is_arg:
+                self.writer.instr('addr_arg', var_name(expr.variable))
             else:
-                assert False, 'unknown const type'
+                self.writer.instr('addr_var', var_name(expr.variable))
 
-        elif isinstance(expr, ast.Assn):
-            stk = self._gen(expr.variable, stk)
-            stk = self._gen(expr.value, stk)
+        else:
+            assert False, 'unknown var type'
+
+    @visitor.on('expr', ast.Const)
+    def _expr_const(self, expr: ast.Const, stk: TypeList) -> None:
+        if expr.type == 'num':
+            self.writer.instr('const_i', int(expr.value, 0))
+        elif expr.type == 'float':
+            self.writer.instr('const_f', float(expr.value))
+        else:
+            assert False, 'unknown const type'
 
-            self.writer.instr('store', self._type(expr.value.expr_type))
+    @visitor.on('expr', ast.Assn)
+    def _expr_assn(self, expr: ast.Assn, stk: TypeList) -> None:
+        stk = self._gen(expr.variable, stk)
+        stk = self._gen(expr.value, stk)
 
-        elif isinstance(expr, ast.IncAssn):
-            # left
-            stk = self._gen(expr.variable, stk)
-            self.writer.instr('dup', self._type(expr.variable.expr_type))
-            # FIXME: this only works for buitin operators
-            self.writer.instr('load', self._type(expr.match.params[0].type))
+        self.writer.instr('store', self._type(expr.value.expr_type))
 
-            # right
-            stk = self._gen(expr.value, stk)
+    @visitor.on('expr', ast.IncAssn)
+    def _expr_inc_assn(self, expr: ast.IncAssn, stk: TypeList) -> None:
+        # left
+        stk = self._gen(expr.variable, stk)
+        self.writer.instr('dup', self._type(expr.variable.expr_type))
+        # FIXME: this only works for buitin operators
+        self.writer.instr('load', self._type(expr.match.params[0].type))
 
-            # call
-            self._call(expr.match)
+        # right
+        stk = self._gen(expr.value, stk)
 
-            # assn
-            self.writer.instr('store', self._type(expr.match.ret))
+        # call
+        self._call(expr.match)
 
-        elif isinstance(expr, ast.Return):
-            stk = self._gen(expr.value, stk)
+        # assn
+        self.writer.instr('store', self._type(expr.match.ret))
 
-            cxt = self._context[expr.target]
+    @visitor.on('expr', ast.Return)
+    def _expr_return(self, expr: ast.Return, stk: TypeList) -> None:
+        stk = self._gen(expr.value, stk)
 
-            self._exit(stk, cxt['before'])
+        cxt = self._context[expr.target]
 
-            # TODO: cleanup variables for RAII
-            if expr.value.expr_type == builtin.VOID:
-                self.writer.instr('end')
-            else:
-                self.writer.instr('ret', self._type(expr.value.expr_type))
+        self._exit(stk, cxt['before'])
 
-        elif isinstance(expr, ast.Break):
-            stk = self._gen(expr.value, stk)
-            cxt = self._context[expr.target]
+        # TODO: cleanup variables for RAII
+        if expr.value.expr_type == builtin.VOID:
+            self.writer.instr('end')
+        else:
+            self.writer.instr('ret', self._type(expr.value.expr_type))
 
-            if expr.value.expr_type == builtin.VOID:
-                self._exit(stk, cxt['after'])
-            else:
-                self._reduce(stk, cxt['after'])
+    @visitor.on('expr', ast.Break)
+    def _expr_break(self, expr: ast.Break, stk: TypeList) -> None:
+        stk = self._gen(expr.value, stk)
+        cxt = self._context[expr.target]
 
-            self.writer.instr('br', cxt['break'])
+        if expr.value.expr_type == builtin.VOID:
+            self._exit(stk, cxt['after'])
+        else:
+            self._reduce(stk, cxt['after'])
 
-        elif isinstance(expr, ast.Continue):
-            cxt = self._context[expr.target]
+        self.writer.instr('br', cxt['break'])
 
-            self._exit(stk, cxt['before'])
-            self.writer.instr('br', cxt['continue'])
+    @visitor.on('expr', ast.Continue)
+    def _expr_continue(self, expr: ast.Continue, stk: TypeList) -> None:
+        cxt = self._context[expr.target]
 
-        elif isinstance(expr, ast.Redo):
-            cxt = self._context[expr.target]
+        self._exit(stk, cxt['before'])
+        self.writer.instr('br', cxt['continue'])
 
-            self._exit(stk, cxt['before'])
-            self.writer.instr('br', cxt['redo'])
+    @visitor.on('expr', ast.Redo)
+    def _expr_redo(self, expr: ast.Redo, stk: TypeList) -> None:
+        cxt = self._context[expr.target]
 
-        elif isinstance(expr, ast.Noop):
-            # well, it's noop
-            pass
+        self._exit(stk, cxt['before'])
+        self.writer.instr('br', cxt['redo'])
 
-        elif isinstance(expr, ast.Deref):
-            self._gen(expr.expr, stk)
-            self.writer.instr('load', self._type(expr.expr_type))
+    @visitor.on('expr', ast.Noop)
+    def _expr_noop(self, expr: ast.Noop, stk: TypeList) -> None:
+        # well, it's noop
+        pass
 
-        elif isinstance(expr, ast.Void):
-            self.writer.instr('pop', self._type(expr.expr.expr_type))
+    @visitor.on('expr', ast.Deref)
+    def _expr_deref(self, expr: ast.Deref, stk: TypeList) -> None:
+        self._gen(expr.expr, stk)
+        self.writer.instr('load', self._type(expr.expr_type))
 
-        else:
-            assert False, f'unknown expr type {expr}'
+    @visitor.on('expr', ast.Void)
+    def _expr_void(self, expr: ast.Void, stk: TypeList) -> None:
+        self.writer.instr('pop', self._type(expr.expr.expr_type))
 
 
 def type_name(tp: types.Type) -> str:
@@ -960,8 +1010,8 @@ def var_name(var: symbols.Variable) -> str:
     return f'{var.name}_{tp}{var.index}'
 
 
-def quote(s: str) -> str:
-    return f"'{s}'"
+def quote(s: str) -> instr.String:
+    return instr.String(s)
 
 
 def native_type_name(tp: types.Type) -> str:
@@ -1,12 +1,50 @@
-import typing
+from typing import Any, List, Sequence
+
+# opnames of the lines that are not instructions; pseudo-instructions adding
+# references have an opname of '!' followed by the reference type
+SPACE = ''
+COMMENT = '#'
+LABEL = ':'
+
+
+class String(str):
+    # operand that is a string literal rather than a name, quoted in text
+    __slots__ = []
 
 
 class Instr:
+    # operands are typed values: ints and floats for numbers, and strings for
+    # names, labels and string literals; comments keep a format string and
+    # its arguments, so that text is only produced when printed
+    __slots__ = ['opname', 'args', 'indent']
+
     def __init__(self,
-                 tokens: typing.Sequence[str],
-                 indent: int) -> None:
-        self.tokens = tokens
+                 opname: str,
+                 args: Sequence[Any] = (),
+                 indent: int = 0) -> None:
+        self.opname = opname
+        self.args = args
         self.indent = indent
 
+    @property
+    def tokens(self) -> List[str]:
+        if self.opname == SPACE:
+            return []
+
+        if self.opname == COMMENT:
+            return ['# ' + self.args[0].format(*self.args[1:])]
+
+        if self.opname == LABEL:
+            return [f'{self.args[0]}:']
+
+        return [self.opname] + [format_arg(arg) for arg in self.args]
+
     def __str__(self) -> str:
         return '  ' * self.indent + ' '.join(self.tokens)
+
+
+def format_arg(arg: Any) -> str:
+    if isinstance(arg, String):
+        return f"'{arg}'"
+
+    return str(arg)
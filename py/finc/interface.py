@@ -0,0 +1,234 @@
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+from pathlib import Path
+from . import builtin
+from . import cache
+from . import symbols
+from . import types
+
+
+# bump whenever the interface format changes
+VERSION = 1
+
+
+def dump(mod: symbols.Module) -> Dict[str, Any]:
+    structs = []
+    enums = []
+    functions = []
+
+    for sym in mod.symbols.values():
+        if isinstance(sym, symbols.Struct):
+            structs.append({
+                'name': sym.name,
+                'generics': [g.name for g in sym.generics],
+                'fields': [_dump_var(f, mod) for f in sym.fields],
+            })
+
+        elif isinstance(sym, symbols.Enumeration):
+            enums.append({
+                'name': sym.name,
+                'generics': [g.name for g in sym.generics],
+                'variants': [{
+                    'name': v.name,
+                    'fields': [_dump_var(f, mod) for f in v.fields],
+                } for v in sym.variants],
+            })
+
+        elif isinstance(sym, symbols.FunctionGroup):
+            for fn in sorted(sym.functions, key=lambda f: f.basename()):
+                functions.append({
+                    'name': fn.name,
+                    'generics': [g.name for g in fn.generics],
+                    'params': [_dump_var(p, mod) for p in fn.params],
+                    'ret': _dump_type(fn.ret, mod),
+                })
+
+    return {
+        'imports': [ref.fullname() for ref in mod.references.values()],
+        'structs': structs,
+        'enums': enums,
+        'functions': functions,
+    }
+
+
+def dependencies(mod: symbols.Module) -> List[symbols.Module]:
+    # modules imported directly or through other imports, since types of the
+    # latter can be exposed by the interfaces of the former
+    deps: Dict[str, symbols.Module] = {}
+    stack = list(mod.references.values())
+    while len(stack) > 0:
+        ref = stack.pop()
+        name = ref.fullname()
+        if name in deps:
+            continue
+
+        deps[name] = ref
+        stack += ref.references.values()
+
+    return [deps[name] for name in sorted(deps)]
+
+
+def digest(mod: symbols.Module) -> str:
+    data = json.dumps(dump(mod), sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def location(source: Path) -> Path:
+    # interfaces are kept in the cache, named after the path of their source,
+    # so that source trees are never written to
+    path = str(source.resolve()).encode()
+    name = f'{source.stem}-{hashlib.sha256(path).hexdigest()[:16]}.fmi'
+    return cache.directory() / 'interfaces' / name
+
+
+def write(mod: symbols.Module, path: Path, digest: str) -> None:
+    data = dump(mod)
+    data['version'] = VERSION
+    data['source'] = digest
+
+    cache.store(path, json.dumps(data, indent=1).encode())
+
+
+def read(path: Path, digest: str) -> Optional[Dict[str, Any]]:
+    try:
+        with path.open() as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # stale interface
+    if data.get('version') != VERSION or data.get('source') != digest:
+        return None
+
+    return data
+
+
+def imports(data: Dict[str, Any]) -> List[str]:
+    return data['imports']
+
+
+def define(data: Dict[str, Any],
+           mod: symbols.Module,
+           parent: symbols.Module) -> None:
+    for name in data['imports']:
+        ref = parent
+        for seg in name.split(':'):
+            ref = ref.member(seg, symbols.Module)
+
+        assert isinstance(ref, symbols.Module)
+        mod.add_reference(ref)
+
+    # declare everything first, since types may refer to any struct / enum
+    structs = []
+    for st in data['structs']:
+        struct = symbols.Struct(st['name'])
+        mod.add_struct(struct)
+        structs.append(struct)
+
+    enums = []
+    for en in data['enums']:
+        enum = symbols.Enumeration(en['name'])
+        mod.add_enum(enum)
+        enums.append(enum)
+
+    for struct, st in zip(structs, data['structs']):
+        for gen in st['generics']:
+            struct.add_generic(gen)
+
+        for name, tp in st['fields']:
+            struct.add_field(name, _load_type(tp, struct))
+
+    for enum, en in zip(enums, data['enums']):
+        for gen in en['generics']:
+            enum.add_generic(gen)
+
+        for vt in en['variants']:
+            var = enum.add_variant(vt['name'])
+
+            for name, tp in vt['fields']:
+                var.add_field(name, _load_type(tp, enum))
+
+    for fd in data['functions']:
+        fn = symbols.Function(fd['name'])
+        mod.add_function(fn)
+
+        for gen in fd['generics']:
+            fn.add_generic(gen)
+
+        for name, tp in fd['params']:
+            fn.add_param(name, _load_type(tp, fn))
+
+        fn.set_ret(_load_type(fd['ret'], fn))
+
+
+def _dump_var(var: symbols.Variable, mod: symbols.Module) -> List[Any]:
+    # variant fields are stored as 'Variant:field'
+    name = var.name.rsplit(':', 1)[-1]
+    return [name, _dump_type(var.type, mod)]
+
+
+def _dump_type(tp: types.Type, mod: symbols.Module) -> Any:
+    if tp == builtin.VOID:
+        return None
+
+    if isinstance(tp, types.Reference):
+        return ['&', _dump_type(tp.type, mod)]
+
+    if isinstance(tp, types.Array):
+        return ['[]', _dump_type(tp.type, mod), tp.length]
+
+    if isinstance(tp, types.Generic):
+        return ['generic', tp.name]
+
+    if isinstance(tp, (types.StructType, types.EnumerationType)):
+        sym = tp.symbol
+        owner = sym.module()
+
+        # same path as one would write in the source of the module
+        path: List[str]
+        if owner is mod or mod.builtins.symbols.get(sym.name) is sym:
+            path = [sym.name]
+        else:
+            path = [owner.name, sym.name]
+
+        return ['named', path, [_dump_type(g, mod) for g in tp.generics]]
+
+    assert False, f'unknown type {tp}'
+
+
+def _load_type(val: Any, scope: symbols.SymbolTable) -> types.Type:
+    if val is None:
+        return builtin.VOID
+
+    kind = val[0]
+
+    if kind == '&':
+        return types.Reference(_load_type(val[1], scope))
+
+    if kind == '[]':
+        return types.Array(_load_type(val[1], scope), val[2])
+
+    if kind == 'generic':
+        gen = scope.get(val[1], symbols.Generic)
+        assert isinstance(gen, symbols.Generic)
+        return types.Generic(gen)
+
+    if kind == 'named':
+        path = val[1]
+        sym = scope.get(path[0], symbols.Scope)
+        for seg in path[1:]:
+            assert isinstance(sym, symbols.Scope)
+            sym = sym.member(seg, symbols.Scope)
+
+        assert isinstance(sym, (symbols.Struct, symbols.Enumeration))
+
+        gens = types.Generics(sym.generics,
+                              [_load_type(g, scope) for g in val[2]])
+
+        if isinstance(sym, symbols.Struct):
+            return types.StructType(sym, gens)
+
+        return types.EnumerationType(sym, gens)
+
+    assert False, f'unknown interface type {val}'
@@ -1,8 +1,9 @@
-from typing import Dict, Iterable, Iterator
+from typing import Dict, Iterable, Iterator, List, Tuple
 import string
 from pathlib import Path
+from . import cache
 from .error import LexerError
-from .tokens import Token
+from .tokens import Lines, Token, TokenBuffer
 
 
 class State:
@@ -13,52 +14,115 @@ class State:
         self.accept = self.name[0].isupper()
 
 
+class Grammar:
+    # dense transition table: characters that behave the same in every state
+    # share a class, and transitions[row + class] is the row of the next state
+    # (-1 for none), where row = state * class_count; the start state is 0,
+    # and class 0 has no transitions
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+        self.classes: Dict[str, int] = {}
+        self.class_count = 1
+        self.transitions: List[int] = []
+
+        self.names: List[str] = []
+        self.accepts: List[bool] = []
+        self.token_types: List[str] = []
+        self.keywords: Dict[str, str] = {}
+
+
+def load_grammar(name: str) -> Grammar:
+    source = Path(__file__).parent.parent / 'lex' / f'{name}.lex'
+    return cache.load(f'lex-{name}', source, lambda: build_grammar(source))
+
+
+def build_grammar(source: Path) -> Grammar:
+    states: Dict[str, State] = {}
+    types: Dict[str, str] = {}
+    keywords: Dict[str, str] = {}
+
+    def state(name: str) -> State:
+        if name not in states:
+            states[name] = State(name)
+
+        return states[name]
+
+    # start state always gets number 0
+    state('start')
+
+    with source.open() as syn:
+        for line in syn:
+            segs = line[:-1].split(' ')
+            if segs[0] == '>':
+                start = state(segs[1])
+                trans = expand(segs[2])
+                end = state(segs[3])
+                for c in trans:
+                    start.transitions[c] = end
+            elif segs[0] == 'type':
+                types[segs[1]] = segs[2]
+            elif segs[0] == 'keyword':
+                keywords[segs[1]] = segs[2]
+            else:
+                assert False, f'unknown lexer instruction {segs[0]}'
+
+    grammar = Grammar(source.stem)
+    grammar.keywords = keywords
+
+    numbers = {s: i for i, s in enumerate(states.values())}
+    for st in states.values():
+        grammar.names.append(st.name)
+        grammar.accepts.append(st.accept)
+        grammar.token_types.append(types.get(st.name, st.name))
+
+    # group characters by their transitions in all states
+    columns: Dict[Tuple[int, ...], int] = {}
+    empty = (-1,) * len(states)
+    columns[empty] = 0
+    for c in map(chr, range(128)):
+        col = tuple(numbers[st.transitions[c]]
+                    if c in st.transitions else -1
+                    for st in states.values())
+
+        if col not in columns:
+            columns[col] = len(columns)
+
+        grammar.classes[c] = columns[col]
+
+    grammar.class_count = len(columns)
+    grammar.transitions = [-1] * (len(states) * len(columns))
+    for col, cls in columns.items():
+        for st, target in enumerate(col):
+            if target >= 0:
+                target *= len(columns)
+
+            grammar.transitions[st * len(columns) + cls] = target
+
+    return grammar
+
+
+def expand(trans: str) -> str:
+    return trans \
+        .replace('[ALPHA]', string.ascii_letters) \
+        .replace('[NUM]', string.digits) \
+        .replace('[SPACE]', string.whitespace) \
+        .replace('[LF]', '\n') \
+        .replace('[ANY]', ''.join(map(chr, range(128))))
+
+
 class Lexer:
     def __init__(self, grammar: str) -> None:
-        self.states: Dict[str, State] = {}
-        self.types: Dict[str, str] = {}
-        self.keywords: Dict[str, str] = {}
+        self.grammar = load_grammar(grammar)
         self.disable_indent = False
 
-        source = Path(__file__).parent.parent / 'lex' / f'{grammar}.lex'
-        with source.open() as syn:
-            for line in syn:
-                segs = line[:-1].split(' ')
-                if segs[0] == '>':
-                    start = self._state(segs[1])
-                    trans = self._expand(segs[2])
-                    end = self._state(segs[3])
-                    for c in trans:
-                        start.transitions[c] = end
-                elif segs[0] == 'type':
-                    self.types[segs[1]] = segs[2]
-                elif segs[0] == 'keyword':
-                    self.keywords[segs[1]] = segs[2]
-                else:
-                    assert False, f'unknown lexer instruction {segs[0]}'
-
-        self._start = self.states['start']
-
         self._ind_amount: int = None
         self._indent: int = None
         self._ln: int = None
+        self._source: Lines = None
         self._prev_empty = False
         self._eol_token: Token = None
 
-    def _expand(self, trans: str) -> str:
-        return trans \
-            .replace('[ALPHA]', string.ascii_letters) \
-            .replace('[NUM]', string.digits) \
-            .replace('[SPACE]', string.whitespace) \
-            .replace('[LF]', '\n') \
-            .replace('[ANY]', ''.join(map(chr, range(128))))
-
-    def _state(self, name: str) -> State:
-        if name not in self.states:
-            self.states[name] = State(name)
-
-        return self.states[name]
-
     def _startline(self, line: str) -> Iterator[Token]:
         new_indent = len(line) - len(line.lstrip())
 
@@ -73,11 +137,11 @@ class Lexer:
             diff = new_indent - self._indent
 
             if diff % self._ind_amount != 0:
-                tok = Token('INDENT', line, self._ln, new_indent)
+                tok = Token('INDENT', self._source, self._ln, new_indent)
                 raise LexerError('wrong indent', tok)
 
             for _ in range(diff // self._ind_amount):
-                yield Token('INDENT', line, self._ln)
+                yield Token('INDENT', self._source, self._ln)
 
         elif new_indent < self._indent:
             assert self._eol_token is not None
@@ -86,18 +150,18 @@ class Lexer:
             diff = self._indent - new_indent
 
             if diff % self._ind_amount != 0:
-                tok = Token('DEDENT', line, self._ln, new_indent)
+                tok = Token('DEDENT', self._source, self._ln, new_indent)
                 raise LexerError('wrong dedent', tok)
 
             # end all blocks except the last one
             for _ in range(diff // self._ind_amount - 1):
-                yield Token('DEDENT', line, self._ln)
-                yield Token('EOL', line, self._ln)
+                yield Token('DEDENT', self._source, self._ln)
+                yield Token('EOL', self._source, self._ln)
 
             # also end the last block if followed by an empty line
-            yield Token('DEDENT', line, self._ln)
+            yield Token('DEDENT', self._source, self._ln)
             if self._prev_empty:
-                yield Token('EOL', line, self._ln)
+                yield Token('EOL', self._source, self._ln)
 
         self._indent = new_indent
         self._prev_empty = False
@@ -118,62 +182,79 @@ class Lexer:
 
         yield from self._startline(line)
 
+        grammar = self.grammar
+        classes = grammar.classes
+        count = grammar.class_count
+        transitions = grammar.transitions
+
         start = 0
         end = 0
-        state = self._start
+        row = 0
         while True:
             c = line[end]
 
-            if c in state.transitions:
-                state = state.transitions[c]
+            target = transitions[row + classes.get(c, 0)]
+            if target >= 0:
+                row = target
                 end += 1
 
                 if end == len(line):
                     break
 
-                if state == self._start:
+                if row == 0:
                     start = end
 
                 continue
 
-            if state == self._start:
-                tok = Token(state.name, line, self._ln, start + 1, c)
+            state = row // count
+
+            if state == 0:
+                tok = Token(grammar.names[state],
+                            self._source,
+                            self._ln,
+                            start + 1,
+                            c)
                 raise LexerError(f"invalid character '{c}'", tok)
 
             val = line[start:end]
 
-            if not state.accept:
-                tok = Token(state.name, line, self._ln, start + 1, val)
+            if not grammar.accepts[state]:
+                tok = Token(grammar.names[state],
+                            self._source,
+                            self._ln,
+                            start + 1,
+                            val)
                 raise LexerError(f"invalid token '{val}'", tok)
 
-            if val in self.keywords:
-                tp = self.keywords[val]
+            if val in grammar.keywords:
+                tp = grammar.keywords[val]
                 var = None
-            elif state.name in self.types:
-                tp = self.types[state.name]
-                var = state.name
             else:
-                tp = state.name
-                var = tp
+                tp = grammar.token_types[state]
+                var = grammar.names[state]
 
-            yield Token(tp, line, self._ln, start + 1, val, var)
+            yield Token(tp, self._source, self._ln, start + 1, val, var)
 
             start = end
-            state = self._start
+            row = 0
 
         # since '\n' is part of line, len(line) is exactly the column of EOL
-        self._eol_token = Token('EOL', line, self._ln, len(line), '\n')
+        self._eol_token = Token('EOL',
+                                self._source,
+                                self._ln,
+                                len(line),
+                                '\n')
 
     def read(self, src: Iterable[str]) -> Iterator[Token]:
         self._ind_amount = None
         self._indent = 0
         self._ln = 0
+        self._source = Lines([''])
         self._prev_empty = False
         self._eol_token = None
 
-        # if no lines, 'line' will not be unassigned
-        line = ''
         for line in src:
+            self._source.append(line)
             yield from self._readline(line)
 
         if self._eol_token is not None:
@@ -181,7 +262,14 @@ class Lexer:
 
         if self._ind_amount is not None:
             for _ in range(self._indent // self._ind_amount):
-                yield Token('DEDENT', line, self._ln)
-                yield Token('EOL', line, self._ln)
+                yield Token('DEDENT', self._source, self._ln)
+                yield Token('EOL', self._source, self._ln)
+
+        yield Token('EOF', self._source, self._ln)
+
+    def read_buffer(self, src: Iterable[str]) -> TokenBuffer:
+        buf = TokenBuffer()
+        for tok in self.read(src):
+            buf.append(tok)
 
-        yield Token('EOF', line, self._ln)
+        return buf
@@ -0,0 +1,171 @@
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+from collections import Counter
+from . import instr
+
+# lines that are skipped when matching rules
+IGNORED = {instr.SPACE, instr.COMMENT}
+
+# instructions starting the code of a new function or type, whose slots are
+# named independently of the others
+SECTIONS = {'fn', 'type'}
+
+Rewrite = Callable[[Sequence[instr.Instr], Counter],
+                   Optional[List[instr.Instr]]]
+
+
+class Rule:
+    def __init__(self,
+                 name: str,
+                 pattern: Sequence[str],
+                 rewrite: Rewrite,
+                 lookahead: int = 0) -> None:
+        # the rewrite gets the instructions matching the opnames of the
+        # pattern, followed by up to `lookahead` more, and the number of uses
+        # of each name in the section; it returns the replacement of the
+        # matched instructions, or None if the rule does not apply
+        self.name = name
+        self.pattern = pattern
+        self.rewrite = rewrite
+        self.lookahead = lookahead
+
+
+def _load_var(ins: Sequence[instr.Instr],
+              uses: Counter) -> Optional[List[instr.Instr]]:
+    # addr_var x; load s => load_var x s
+    slot, = ins[0].args
+    size, = ins[1].args
+    return [instr.Instr('load_var', (slot, size), ins[0].indent)]
+
+
+def _store_load(ins: Sequence[instr.Instr],
+                uses: Counter) -> Optional[List[instr.Instr]]:
+    # store_var x s; load_var x s => (nothing), when x is not used anywhere
+    # else, so that the value can stay on the stack
+    if ins[0].args != ins[1].args or uses[ins[0].args[0]] != 2:
+        return None
+
+    return []
+
+
+def _dup_pop(ins: Sequence[instr.Instr],
+             uses: Counter) -> Optional[List[instr.Instr]]:
+    # dup s; pop s => (nothing)
+    if ins[0].args != ins[1].args:
+        return None
+
+    return []
+
+
+def _branch_next(ins: Sequence[instr.Instr],
+                 uses: Counter) -> Optional[List[instr.Instr]]:
+    # br l; l: => (nothing), also when l is one of several labels in a row
+    target, = ins[0].args
+    for label in ins[1:]:
+        if label.opname != instr.LABEL:
+            break
+
+        if label.args[0] == target:
+            return []
+
+    return None
+
+
+RULES = [
+    Rule('load_var', ['addr_var', 'load'], _load_var),
+    Rule('store_load', ['store_var', 'load_var'], _store_load),
+    Rule('dup_pop', ['dup', 'pop'], _dup_pop),
+    Rule('branch_next', ['br'], _branch_next, lookahead=4),
+]
+
+
+class Optimizer:
+    def __init__(self, rules: Sequence[Rule] = RULES) -> None:
+        # rules by the opname of their first instruction
+        self.rules: Dict[str, List[Rule]] = {}
+        for rule in rules:
+            self.rules.setdefault(rule.pattern[0], []).append(rule)
+
+        # number of times each rule was applied
+        self.hits: Counter = Counter()
+
+    def optimize(self, src: Iterable[instr.Instr]) -> List[instr.Instr]:
+        res: List[instr.Instr] = []
+        section: List[instr.Instr] = []
+
+        for ins in src:
+            if ins.opname in SECTIONS:
+                res += self._section(section)
+                section = []
+
+            section.append(ins)
+
+        res += self._section(section)
+        return res
+
+    def _section(self, code: List[instr.Instr]) -> List[instr.Instr]:
+        # rewriting can make new rules match, so repeat until none does
+        while self._pass(code):
+            pass
+
+        return code
+
+    def _pass(self, code: List[instr.Instr]) -> bool:
+        # matched instructions are replaced in place, by the replacement at
+        # the position of the first one and None for the others; lines that
+        # are skipped stay where they are
+        lines = [i for i, ins in enumerate(code)
+                 if ins.opname not in IGNORED]
+
+        # names used by instructions; string literals are not names, and
+        # pseudo-instructions only declare them
+        uses: Counter = Counter()
+        for i in lines:
+            ins = code[i]
+            if ins.opname[0] != '!':
+                for arg in ins.args:
+                    if type(arg) is str:
+                        uses[arg] += 1
+
+        changed = False
+        idx = 0
+        while idx < len(lines):
+            rules = self.rules.get(code[lines[idx]].opname, ())
+            for rule in rules:
+                size = len(rule.pattern)
+                window = [code[i] for i in
+                          lines[idx:idx + size + rule.lookahead]]
+
+                if len(window) < size or \
+                        any(ins.opname != op
+                            for ins, op in zip(window, rule.pattern)):
+                    continue
+
+                rep = rule.rewrite(window, uses)
+                if rep is None:
+                    continue
+
+                self.hits[rule.name] += 1
+                changed = True
+
+                for i in lines[idx:idx + size]:
+                    code[i] = None
+
+                code[lines[idx]] = rep  # type: ignore
+                break
+            else:
+                size = 1
+
+            idx += size
+
+        if changed:
+            # flatten the replacements
+            flat: List[instr.Instr] = []
+            for ins in code:
+                if isinstance(ins, list):
+                    flat += ins
+                elif ins is not None:
+                    flat.append(ins)
+
+            code[:] = flat
+
+        return changed
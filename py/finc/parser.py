@@ -21,6 +21,36 @@ def set_loc(fn: TFn) -> TFn:
     return cast(TFn, wrap)
 
 
+# binding powers of operators, higher binds tighter
+BINARY_POWERS = {
+    'OR': 1,
+    'AND': 2,
+    'COMP': 4,
+    'PLUS': 5,
+    'MINUS': 5,
+    'MULTIPLIES': 6,
+    'DIVIDES': 6,
+    'MODULUS': 6,
+}
+NOT_POWER = 3
+UNARY_POWER = 7
+MAX_POWER = 8
+
+UNARY_OPS = {
+    'PLUS': 'pos',
+    'MINUS': 'neg',
+}
+
+COMPARISONS = {
+    'EQ': 'equal',
+    'NE': 'notEqual',
+    'LT': 'less',
+    'LE': 'lessEqual',
+    'GT': 'greater',
+    'GE': 'greaterEqual',
+}
+
+
 class Parser:
     def __init__(self) -> None:
         self._src: Iterator[tokens.Token] = None
@@ -364,7 +394,7 @@ class Parser:
 
     @set_loc
     def _test(self) -> ast.Expr:
-        n = self._or_test()
+        n = self._operators(0)
 
         if self._lookahead.type == 'ASSN':
             self._next()  # ASSN
@@ -382,97 +412,53 @@ class Parser:
 
         return n
 
-    @set_loc
-    def _or_test(self) -> ast.Expr:
-        n = self._and_test()
-        while self._lookahead.type == 'OR':
-            self._next()
-            r = self._and_test()
-            n = ast.BinTest(n, 'or', r)
-
-        return n
-
-    @set_loc
-    def _and_test(self) -> ast.Expr:
-        n = self._not_test()
-        while self._lookahead.type == 'AND':
-            self._next()
-            r = self._not_test()
-            n = ast.BinTest(n, 'and', r)
+    def _operators(self, min_power: int) -> ast.Expr:
+        # precedence climbing, only operators binding at least as tight as
+        # min_power are consumed
+        start = self._lookahead
 
-        return n
+        # operators that may follow the current node, which is used to reject
+        # chained comparisons
+        limit = MAX_POWER
 
-    @set_loc
-    def _not_test(self) -> ast.Expr:
-        if self._lookahead.type != 'NOT':
-            return self._comp()
+        if start.type == 'NOT' and min_power <= NOT_POWER:
+            self._next()  # NOT
+            val = self._operators(NOT_POWER)
+            n: ast.Expr = ast.NotTest(val)
+            n.set_loc(start, self._prev)
+            limit = NOT_POWER
 
-        self._next()
-        val = self._not_test()
-        return ast.NotTest(val)
+        elif start.type in UNARY_OPS:
+            self._next()  # PLUS / MINUS
+            val = self._operators(UNARY_POWER)
+            n = ast.Op(UNARY_OPS[start.type], ast.List([val]))
+            n.set_loc(start, self._prev)
 
-    @set_loc
-    def _comp(self) -> ast.Expr:
-        n = self._expr()
-        if self._lookahead.type != 'COMP':
-            return n
-
-        if self._lookahead.variant == 'EQ':
-            op = 'equal'
-        elif self._lookahead.variant == 'NE':
-            op = 'notEqual'
-        elif self._lookahead.variant == 'LT':
-            op = 'less'
-        elif self._lookahead.variant == 'LE':
-            op = 'lessEqual'
-        elif self._lookahead.variant == 'GT':
-            op = 'greater'
-        elif self._lookahead.variant == 'GE':
-            op = 'greaterEqual'
         else:
-            assert False
+            n = self._atom_expr()
 
-        self._next()  # COMP
-        r = self._expr()
-        return ast.Op(op, ast.List([n, r]))
+        while True:
+            op = self._lookahead
+            power = BINARY_POWERS.get(op.type, 0)
+            if power < min_power or power >= limit or power == 0:
+                break
 
-    @set_loc
-    def _expr(self) -> ast.Expr:
-        n: ast.Expr = self._term()
-        while self._lookahead.type in ['PLUS', 'MINUS']:
-            op = self._lookahead.type.lower()
             self._next()
-            r = self._term()
-            n = ast.Op(op, ast.List([n, r]))
+            r = self._operators(power + 1)
 
-        return n
-
-    @set_loc
-    def _term(self) -> ast.Expr:
-        n = self._factor()
-        while self._lookahead.type in ['MULTIPLIES', 'DIVIDES', 'MODULUS']:
-            op = self._lookahead.type.lower()
-            self._next()
-            r = self._factor()
-            n = ast.Op(op, ast.List([n, r]))
+            if op.type in ['OR', 'AND']:
+                n = ast.BinTest(n, op.type.lower(), r)
+            elif op.type == 'COMP':
+                n = ast.Op(COMPARISONS[op.variant], ast.List([n, r]))
+            else:
+                n = ast.Op(op.type.lower(), ast.List([n, r]))
 
-        return n
+            n.set_loc(start, self._prev)
 
-    @set_loc
-    def _factor(self) -> ast.Expr:
-        if self._lookahead.type not in ['PLUS', 'MINUS']:
-            return self._atom_expr()
-
-        if self._lookahead.type == 'PLUS':
-            op = 'pos'
-        elif self._lookahead.type == 'MINUS':
-            op = 'neg'
-        else:
-            assert False, 'unreachable'
+            # comparisons are non-associative
+            limit = power if op.type == 'COMP' else power + 1
 
-        self._next()
-        val = self._factor()
-        return ast.Op(op, ast.List([val]))
+        return n
 
     @set_loc
     def _atom_expr(self) -> ast.Expr:
@@ -0,0 +1,74 @@
+from typing import Any, Dict, Iterator, List
+import contextlib
+import time
+import tracemalloc
+
+
+class Pass:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.time = 0.0
+        self.memory = 0
+        self.counters: Dict[str, int] = {}
+
+    def count(self, name: str, value: int) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+
+class Stats:
+    def __init__(self, enabled: bool = True, memory: bool = True) -> None:
+        self.enabled = enabled
+        self.passes: List[Pass] = []
+
+        # tracing memory slows down every allocation, so it can be disabled
+        # to get accurate timings
+        self.memory = memory
+
+    @contextlib.contextmanager
+    def measure(self, name: str) -> Iterator[Pass]:
+        pas = Pass(name)
+
+        if not self.enabled:
+            yield pas
+            return
+
+        self.passes.append(pas)
+
+        # only allocations made by this pass are traced, so the peak is
+        # relative to the memory in use when it started
+        if self.memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+
+        try:
+            yield pas
+        finally:
+            pas.time = time.perf_counter() - start
+
+            if self.memory:
+                _, pas.memory = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+    def dump(self) -> Dict[str, Any]:
+        return {
+            'passes': [{
+                'name': pas.name,
+                'time': pas.time,
+                'memory': pas.memory,
+                'counters': pas.counters,
+            } for pas in self.passes],
+            'time': sum(pas.time for pas in self.passes),
+        }
+
+    def report(self) -> str:
+        lines = [f'{"pass":<16}{"time (ms)":>12}{"peak (KiB)":>12}  counters']
+        for pas in self.passes:
+            counters = ', '.join(f'{name}={val}'
+                                 for name, val in pas.counters.items())
+            lines.append(f'{pas.name:<16}{pas.time * 1000:>12.3f}'
+                         f'{pas.memory / 1024:>12.1f}  {counters}')
+
+        total = sum(pas.time for pas in self.passes)
+        lines.append(f'{"total":<16}{total * 1000:>12.3f}')
+        return '\n'.join(lines)
@@ -1,11 +1,18 @@
-from typing import Tuple, Dict, Any, Set, List, TypeVar
+from typing import Tuple, Dict, Any, Set, List, TypeVar, Hashable, Sequence, \
+    Iterable
 import typing
+from collections import Counter
 from . import types
 from . import error
 
 
 TTbl = TypeVar('TTbl', bound='SymbolTable')
 
+# number of name lookups, and of scopes visited to resolve them; only counted
+# when enabled, as lookups are the hottest path of the analysis
+lookups: Counter = Counter()
+counting = False
+
 
 def check_type(sym: 'Symbol', tps: Tuple[type, ...]):
     for tp in tps:
@@ -18,6 +25,20 @@ def check_type(sym: 'Symbol', tps: Tuple[type, ...]):
         sym)
 
 
+def clear_candidates(root: 'SymbolTable') -> None:
+    # function groups remember candidates by argument types, which may belong
+    # to any module; groups shared between compilations must forget them, so
+    # that they don't keep the symbols of earlier compilations alive
+    stack = [root]
+    while len(stack) > 0:
+        tbl = stack.pop()
+        for sym in tbl.symbols.values():
+            if isinstance(sym, FunctionGroup):
+                sym._candidates.clear()
+            elif isinstance(sym, SymbolTable):
+                stack.append(sym)
+
+
 class Symbol:
     name: str
 
@@ -39,6 +60,9 @@ class SymbolTable:
         self.symbols[name] = sym
 
     def _find(self, name: str) -> Symbol:
+        if counting:
+            lookups['hops'] += 1
+
         if name in self.symbols:
             return self.symbols[name]
 
@@ -66,6 +90,8 @@ class SymbolTable:
         self.references[mod.name] = mod
 
     def get(self, name: str, *tps: type) -> Symbol:
+        if counting:
+            lookups['lookups'] += 1
         sym = self._find(name)
 
         if sym is None:
@@ -102,6 +128,48 @@ class SymbolTable:
         return self.ancestor(Module)
 
 
+class CachedTable(SymbolTable):
+    # symbol table that remembers the symbols found in enclosing scopes; an
+    # entry stays valid until the same name is added anywhere in the
+    # function, which may shadow the remembered symbol
+    def __init__(self, parent: SymbolTable = None) -> None:
+        super().__init__(parent)
+
+        self._lookups: Dict[str, Tuple[Symbol, int]] = {}
+
+    def _function(self) -> 'Function':
+        raise NotImplementedError()
+
+    def _find(self, name: str) -> Symbol:
+        sym = self.symbols.get(name, None)
+        if sym is not None:
+            if counting:
+                lookups['hops'] += 1
+            return sym
+
+        version = self._function().versions.get(name, 0)
+
+        found = self._lookups.get(name, None)
+        if found is not None and found[1] == version:
+            if counting:
+                lookups['hops'] += 1
+            return found[0]
+
+        sym = super()._find(name)
+
+        # misses are not remembered, as the name may still be declared
+        if sym is not None:
+            self._lookups[name] = (sym, version)
+
+        return sym
+
+    def _add_symbol(self, name: str, sym: Symbol) -> None:
+        super()._add_symbol(name, sym)
+
+        versions = self._function().versions
+        versions[name] = versions.get(name, 0) + 1
+
+
 class Constant(Symbol):
     def __init__(self, name: str, tp: 'types.Type', val: Any) -> None:
         self.name = name
@@ -171,6 +239,11 @@ class Module(Scope):
         self.name = name
         self.builtins = builtins
 
+        # function groups providing each operator looked up so far, from this
+        # module, the builtins and the references; kept up to date as
+        # functions and references are added
+        self._operators: Dict[str, List[FunctionGroup]] = {}
+
         if parent is not None:
             parent.add_module(self)
 
@@ -181,6 +254,9 @@ class Module(Scope):
         return self.name < other.name
 
     def _find(self, name: str) -> Symbol:
+        if counting:
+            lookups['hops'] += 1
+
         if name in self.symbols:
             return self.symbols[name]
 
@@ -202,6 +278,14 @@ class Module(Scope):
 
         return path
 
+    def add_reference(self, mod: 'Module') -> None:
+        super().add_reference(mod)
+
+        for name, groups in self._operators.items():
+            fns = mod.symbols.get(name, None)
+            if isinstance(fns, FunctionGroup):
+                groups.append(fns)
+
     def add_module(self, mod: 'Module') -> None:
         self._add_symbol(mod.name, mod)
         mod.parent = self
@@ -219,6 +303,9 @@ class Module(Scope):
             group = FunctionGroup(fn.name)
             self.symbols[fn.name] = group
 
+            if fn.name in self._operators:
+                self._operators[fn.name].append(group)
+
         else:
             sym = self.symbols[fn.name]
 
@@ -238,23 +325,23 @@ class Module(Scope):
     def add_constant(self, const: Constant) -> None:
         self._add_symbol(const.name, const)
 
-    def operators(self, name: str) -> Set['types.Match']:
-        ops: Set[types.Match]
-
-        fns = self.symbols.get(name, None)
-        if isinstance(fns, FunctionGroup):
-            ops = fns.overloads()
-        else:
-            ops = set()
-
-        fns = self.builtins.symbols.get(name, None)
-        if isinstance(fns, FunctionGroup):
-            ops |= fns.overloads()
-
-        for ref in self.references.values():
-            fns = ref.symbols.get(name, None)
-            if isinstance(fns, FunctionGroup):
-                ops |= fns.overloads()
+    def operators(self,
+                  name: str,
+                  args: Sequence['types.Type'] = None,
+                  stats: Counter = None) -> Set['types.Match']:
+        # with arguments, only overloads that can possibly accept them are
+        # returned
+        groups = self._operators.get(name, None)
+        if groups is None:
+            scopes = [self, self.builtins] + list(self.references.values())
+            groups = [scope.symbols[name] for scope in scopes
+                      if isinstance(scope.symbols.get(name, None),
+                                    FunctionGroup)]
+            self._operators[name] = groups
+
+        ops: Set[types.Match] = set()
+        for group in groups:
+            ops |= group.overloads(args, stats)
 
         return ops
 
@@ -282,7 +369,9 @@ class Struct(Scope):
         self._add_symbol(name, field)
         return field
 
-    def overloads(self) -> Set['types.Match']:
+    def overloads(self,
+                  args: Sequence['types.Type'] = None,
+                  stats: Counter = None) -> Set['types.Match']:
         ret = types.StructType(self)
         return {types.Match(self, self.generics, self.fields, ret)}
 
@@ -338,17 +427,23 @@ class Variant(Scope):
         self._add_symbol(name, field)
         return field
 
-    def overloads(self) -> Set['types.Match']:
+    def overloads(self,
+                  args: Sequence['types.Type'] = None,
+                  stats: Counter = None) -> Set['types.Match']:
         ret = types.EnumerationType(self.enum)
         return {types.Match(self, self.enum.generics, self.fields, ret)}
 
 
-class Function(Scope):
+class Function(CachedTable, Scope):
     def __init__(self, name: str) -> None:
         super().__init__()
 
         self.name = name
 
+        # number of times each name was added in the function, see
+        # CachedTable
+        self.versions: Dict[str, int] = {}
+
         self.ret: types.Type = None
         self.params: List[Variable] = []
         # note: not in symbol table of function, they are in Block instead
@@ -387,31 +482,107 @@ class Function(Scope):
     def set_ret(self, ret: 'types.Type') -> None:
         self.ret = ret
 
+    def _function(self) -> 'Function':
+        return self
+
+
+# function with the heads of its parameter types
+Candidate = Tuple[Function, Tuple[Hashable, ...]]
+
 
 class FunctionGroup(Symbol):
     def __init__(self, name: str) -> None:
         self.name = name
         self.functions: Set[Function] = set()
 
+        # functions by number of parameters, and with the heads of their
+        # parameter types by number of parameters and head of the first
+        # parameter type; built on first lookup, as parameters are only known
+        # once the functions are declared
+        self._arities: Dict[int, List[Function]] = None
+        self._buckets: Dict[int, Dict[Hashable, List[Candidate]]] = None
+
+        # candidates by argument types, which are interned
+        self._candidates: Dict[Tuple['types.Type', ...], List[Function]] = {}
+
     def __str__(self) -> str:
         return self.name
 
     def add(self, fn: Function) -> None:
         self.functions.add(fn)
+        self._arities = None
+        self._buckets = None
+        self._candidates.clear()
+
+    def overloads(self,
+                  args: Sequence['types.Type'] = None,
+                  stats: Counter = None) -> Set['types.Match']:
+        fns: Iterable[Function] = self.functions
+        if args is not None:
+            fns = self.candidates(args)
+
+            if stats is not None:
+                stats['candidates'] += len(self.functions)
+                stats['pruned'] += len(self.functions) - len(fns)
+
+        return {types.Match(f, f.generics, f.params, f.ret) for f in fns}
+
+    def candidates(self, args: Sequence['types.Type']) -> List[Function]:
+        # functions that may accept the arguments, judging by their number
+        # and the heads of their types only
+        key = tuple(args)
+        fns = self._candidates.get(key, None)
+        if fns is None:
+            fns = self._filter(args)
+            self._candidates[key] = fns
+
+        return fns
+
+    def _filter(self, args: Sequence['types.Type']) -> List[Function]:
+        # a single function is rejected just as cheaply by overload matching
+        if len(self.functions) == 1:
+            return list(self.functions)
+
+        if self._buckets is None:
+            self._arities = {}
+            self._buckets = {}
+            for fn in self.functions:
+                heads = tuple(types.head(p.type) for p in fn.params)
+                self._arities.setdefault(len(heads), []).append(fn)
+                bucket = self._buckets.setdefault(len(heads), {})
+                bucket.setdefault(heads[0] if heads else None, []) \
+                    .append((fn, heads))
+
+        fns = self._arities.get(len(args), [])
+        if len(fns) <= 1:
+            return fns
+
+        bucket = self._buckets[len(args)]
+        accepted = [types.accepted_heads(a) for a in args]
+
+        cands: Iterable[Candidate]
+        if len(args) == 0 or accepted[0] is None:
+            cands = (c for cs in bucket.values() for c in cs)
+        else:
+            cands = (c for head in accepted[0] for c in bucket.get(head, ()))
 
-    def overloads(self) -> Set['types.Match']:
-        return {types.Match(f, f.generics, f.params, f.ret)
-                for f in self.functions}
+        return [fn for fn, heads in cands
+                if all(acc is None or head is None or head in acc
+                       for head, acc in zip(heads, accepted))]
 
 
-class Block(SymbolTable):
+class Block(CachedTable):
     def __init__(self, parent: SymbolTable) -> None:
         super().__init__(parent)
 
         self.locals: List[Variable] = []
+        self.function = self.ancestor(Function)
+
+    def _function(self) -> Function:
+        return self.function
 
     def add_local(self, name: str, tp: 'types.Type') -> Variable:
-        var = self.ancestor(Function).add_local(name, tp)
+        var = self.function.add_local(name, tp)
         self.locals.append(var)
         self._add_symbol(name, var)
         return var
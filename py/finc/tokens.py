@@ -1,18 +1,42 @@
+from typing import Dict, Iterator, List
+from array import array
+
+
+# source lines of a file, shared by all of its tokens; index 0 is empty so
+# that line numbers can be used as indices
+class Lines(List[str]):
+    __slots__ = []
+
+
+# token positions (line, column and length) are packed into integers, with
+# each field taking POSITION_BITS bits
+POSITION_BITS = 24
+POSITION_MASK = (1 << POSITION_BITS) - 1
+TOKEN_BITS = 3 * POSITION_BITS
+TOKEN_MASK = (1 << TOKEN_BITS) - 1
+
+
 class Token:
+    __slots__ = ['type', 'source', 'line', 'column', 'value', 'variant']
+
     def __init__(self,
                  tp: str,
-                 src: str,
+                 source: Lines,
                  line: int,
                  col: int = 0,
                  val: str = None,
                  var: str = None) -> None:
         self.type = tp
-        self.src = src
+        self.source = source
         self.line = line
         self.column = col
         self.value = val
         self.variant = var
 
+    @property
+    def src(self) -> str:
+        return self.source[self.line]
+
     def __repr__(self) -> str:
         s = self.type
         if self.variant:
@@ -20,3 +44,77 @@ class Token:
         if self.value:
             s += ' ' + self.value
         return s
+
+
+def pack(tok: Token) -> int:
+    length = len(tok.value) if tok.value is not None else 0
+    return (((tok.line << POSITION_BITS) | tok.column) << POSITION_BITS) | \
+        length
+
+
+def pack_span(start: Token, end: Token) -> int:
+    return (pack(start) << TOKEN_BITS) | pack(end)
+
+
+def unpack(source: Lines, pos: int) -> Token:
+    # only the position of the token can be recovered
+    length = pos & POSITION_MASK
+    pos >>= POSITION_BITS
+    col = pos & POSITION_MASK
+    line = pos >> POSITION_BITS
+
+    val = None
+    if length > 0:
+        val = source[line][col - 1:col - 1 + length]
+
+    return Token(None, source, line, col, val)
+
+
+class TokenBuffer:
+    # struct-of-arrays token stream: types and variants are stored as integer
+    # codes and positions in arrays
+
+    def __init__(self) -> None:
+        # code 0 is None
+        self.names: List[str] = [None]
+        self._codes: Dict[str, int] = {None: 0}
+
+        self.types = array('H')
+        self.variants = array('H')
+        self.lines = array('L')
+        self.columns = array('L')
+        self.values: List[str] = []
+        self.source: Lines = None
+
+    def _code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self._codes[name] = code
+            self.names.append(name)
+
+        return code
+
+    def append(self, tok: Token) -> None:
+        self.types.append(self._code(tok.type))
+        self.variants.append(self._code(tok.variant))
+        self.lines.append(tok.line)
+        self.columns.append(tok.column)
+        self.values.append(tok.value)
+        self.source = tok.source
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, idx: int) -> Token:
+        return Token(self.names[self.types[idx]],
+                     self.source,
+                     self.lines[idx],
+                     self.columns[idx],
+                     self.values[idx],
+                     self.names[self.variants[idx]])
+
+    def __iter__(self) -> Iterator[Token]:
+        # tokens are only created when needed
+        for idx in range(len(self.types)):
+            yield self[idx]
@@ -1,6 +1,7 @@
 from typing import Any, Sequence, List, Dict, Iterator, Iterable, Union, Set, \
-    Sized
+    Sized, Hashable, Tuple
 import math
+import weakref
 from . import builtin
 from . import symbols
 
@@ -8,13 +9,38 @@ from . import symbols
 MATCH_PERFECT = 3.0
 MATCH_TO_VOID = 1.0
 
+# live types by structural key; entries go away with the last reference to
+# the type
+_interned: 'weakref.WeakValueDictionary[Hashable, Type]' = \
+    weakref.WeakValueDictionary()
 
-class Type:
-    def __eq__(self, other: object) -> bool:
+
+class Interned(type):
+    # types are hash-consed: constructing a type that is structurally equal to
+    # a live one returns that object instead, so types compare and hash by
+    # identity and can be used as dict keys
+    def __call__(cls, *args: Any) -> Any:
+        key = cls._key(*args)  # type: ignore
+        tp = _interned.get(key)
+        if tp is None:
+            tp = super().__call__(*args)
+            _interned[key] = tp
+
+        return tp
+
+
+class Type(metaclass=Interned):
+    # heads of the parameter types accepting this type, see accepted_heads
+    _accepted: Set[Hashable] = None
+
+    @classmethod
+    def _key(cls, *args: Any) -> Hashable:
+        # structural key; arguments are the same as the constructor's
         raise NotImplementedError()
 
-    def __ne__(self, other: object) -> bool:
-        return not self.__eq__(other)
+    def __reduce__(self) -> Any:
+        # unpickled types go through the constructor to be interned again
+        raise NotImplementedError()
 
     def fullname(self) -> str:
         raise NotImplementedError()
@@ -250,6 +276,9 @@ class Match:
         self._levels: List[float] = None
         self._resolved = False
 
+        # key of the instantiation, once resolved
+        self.instance: Hashable = None
+
     def __lt__(self, other: 'Match') -> bool:
         assert len(self._levels) == len(other._levels)
 
@@ -272,6 +301,16 @@ class Match:
     def __repr__(self) -> str:
         return f'{self} {self._levels}'
 
+    def __getstate__(self) -> Dict[str, Any]:
+        # once resolved, only the instantiation is needed, so the state of
+        # the resolution is not pickled
+        state = dict(self.__dict__)
+        if self._resolved:
+            state['resolution'] = None
+            state['_levels'] = None
+
+        return state
+
     def update(self, args: Sequence[Type], ret: Type) -> bool:
         # None: type mismatch
         # 1: casting to none
@@ -295,20 +334,54 @@ class Match:
 
         return None not in self._levels
 
-    def resolve(self) -> bool:
+    def resolve(self, instances: 'Instantiations' = None) -> bool:
         assert not self._resolved
 
         if not self.resolution.resolved():
             return False
 
-        self.generics = self.generics.resolve(self.resolution)
-        self.params = self.params.resolve(self.resolution)
-        self.ret = self.ret.resolve(self.resolution)
+        key = (self.source, frozenset(self.resolution.generics.items()))
+
+        inst = instances.get(key) if instances is not None else None
+        if inst is None:
+            inst = (self.generics.resolve(self.resolution),
+                    self.params.resolve(self.resolution),
+                    self.ret.resolve(self.resolution))
+
+            if instances is not None:
+                instances.put(key, inst)
+
+        self.generics, self.params, self.ret = inst
+        self.instance = key
 
         self._resolved = True
         return True
 
 
+Instance = Tuple['Generics', 'Variables', Type]
+
+
+class Instantiations:
+    # generic arguments, parameters and return type of every instantiation
+    # of a function or constructor, by source symbol and generic arguments,
+    # so that each is only resolved once per compilation; the generator adds
+    # the mangled names of instantiations and types
+    def __init__(self) -> None:
+        self._instances: Dict[Hashable, Instance] = {}
+        self.names: Dict[Hashable, str] = {}
+        self.hits = 0
+
+    def get(self, key: Hashable) -> Instance:
+        inst = self._instances.get(key, None)
+        if inst is not None:
+            self.hits += 1
+
+        return inst
+
+    def put(self, key: Hashable, inst: Instance) -> None:
+        self._instances[key] = inst
+
+
 class Generics(Iterable[Type], Sized):
     def __init__(self,
                  gens: Sequence['symbols.Generic'],
@@ -439,18 +512,19 @@ class Reference(Type):
     def __init__(self, tp: Type) -> None:
         self.type = tp
 
+    @classmethod
+    def _key(cls, tp: Type) -> Hashable:
+        return (cls, tp)
+
+    def __reduce__(self) -> Any:
+        return (Reference, (self.type,))
+
     def __format(self, tp: Any) -> str:
         return '&' + str(tp)
 
     def __str__(self) -> str:
         return self.__format(self.type)
 
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, Reference):
-            return False
-
-        return self.type == other.type
-
     def fullname(self) -> str:
         return self.__format(self.type.fullname())
 
@@ -464,6 +538,13 @@ class Array(Type):
         self.type = tp
         self.length = length
 
+    @classmethod
+    def _key(cls, tp: Type, length: int = None) -> Hashable:
+        return (cls, tp, length)
+
+    def __reduce__(self) -> Any:
+        return (Array, (self.type, self.length))
+
     def __format(self, tp: Any, sep: str) -> str:
         length = ''
         if self.length is not None:
@@ -474,12 +555,6 @@ class Array(Type):
     def __str__(self) -> str:
         return self.__format(self.type, '; ')
 
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, Array):
-            return False
-
-        return self.type == other.type and self.length == other.length
-
     def fullname(self) -> str:
         return self.__format(self.type.fullname(), ';')
 
@@ -493,14 +568,15 @@ class Generic(Type):
         self.name = sym.name
         self.symbol = sym
 
-    def __str__(self) -> str:
-        return self.name
+    @classmethod
+    def _key(cls, sym: symbols.Generic) -> Hashable:
+        return (cls, sym)
 
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, Generic):
-            return False
+    def __reduce__(self) -> Any:
+        return (Generic, (self.symbol,))
 
-        return self.symbol is other.symbol
+    def __str__(self) -> str:
+        return self.name
 
     def fullname(self) -> str:
         return self.symbol.fullname()
@@ -513,12 +589,16 @@ class Special(Type):
     def __init__(self, name: str) -> None:
         self.name = name
 
+    @classmethod
+    def _key(cls, name: str) -> Hashable:
+        return (cls, name)
+
+    def __reduce__(self) -> Any:
+        return (Special, (self.name,))
+
     def __str__(self) -> str:
         return self.name
 
-    def __eq__(self, other: object) -> bool:
-        return self is other
-
     def fullname(self) -> str:
         return self.name
 
@@ -529,90 +609,96 @@ class Special(Type):
 class StructType(Type):
     def __init__(self,
                  struct: 'symbols.Struct',
-                 gens: Generics = None,
-                 flds: Variables = None) -> None:
+                 gens: Generics = None) -> None:
         self.symbol = struct
         self.generics = gens
-        self.fields = flds
+        self._fields: Variables = None
 
         if gens is None:
             self.generics = Generics(struct.generics)
 
-        if flds is None:
-            self.fields = Variables(struct.fields)
-            if gens is not None:
-                self.fields = self.fields.resolve(gens.resolution())
+    @classmethod
+    def _key(cls,
+             struct: 'symbols.Struct',
+             gens: Generics = None) -> Hashable:
+        return (cls, struct) + generics_key(struct.generics, gens)
 
-    def __str__(self) -> str:
-        return f'{self.symbol}{self.generics}'
+    def __reduce__(self) -> Any:
+        return (StructType, (self.symbol, self.generics))
 
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, StructType):
-            return False
+    @property
+    def fields(self) -> Variables:
+        # fields are only known once the struct is defined, so they are
+        # resolved on first use
+        if self._fields is None:
+            fields = Variables(self.symbol.fields)
+            if self.generics._resolved:
+                fields = fields.resolve(self.generics.resolution())
 
-        if self.symbol is not other.symbol:
-            return False
+            self._fields = fields
 
-        if self.generics != other.generics:
-            return False
+        return self._fields
 
-        return True
+    def __str__(self) -> str:
+        return f'{self.symbol}{self.generics}'
 
     def fullname(self) -> str:
         return f'{self.symbol.fullname()}{self.generics.fullname()}'
 
     def resolve(self, res: Resolution) -> 'StructType':
-        gens = self.generics.resolve(res)
-        return StructType(
-            self.symbol,
-            gens,
-            self.fields.resolve(res)
-        )
+        return StructType(self.symbol, self.generics.resolve(res))
 
 
 class EnumerationType(Type):
     def __init__(self,
                  enum: 'symbols.Enumeration',
-                 gens: Generics = None,
-                 variants: Sequence[Variables] = None) -> None:
+                 gens: Generics = None) -> None:
         self.symbol = enum
         self.generics = gens
-        self.variants = variants
+        self._variants: List[Variables] = None
 
         if gens is None:
             self.generics = Generics(enum.generics)
 
-        if variants is None:
-            self.variants = [Variables(v.fields) for v in enum.variants]
-            if gens is not None:
-                res = gens.resolution()
-                self.variants = [v.resolve(res) for v in self.variants]
+    @classmethod
+    def _key(cls,
+             enum: 'symbols.Enumeration',
+             gens: Generics = None) -> Hashable:
+        return (cls, enum) + generics_key(enum.generics, gens)
 
-    def __str__(self) -> str:
-        return f'{self.symbol}{self.generics}'
+    def __reduce__(self) -> Any:
+        return (EnumerationType, (self.symbol, self.generics))
 
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, EnumerationType):
-            return False
+    @property
+    def variants(self) -> List[Variables]:
+        if self._variants is None:
+            variants = [Variables(v.fields) for v in self.symbol.variants]
+            if self.generics._resolved:
+                res = self.generics.resolution()
+                variants = [v.resolve(res) for v in variants]
 
-        if self.symbol is not other.symbol:
-            return False
+            self._variants = variants
 
-        if self.generics != other.generics:
-            return False
+        return self._variants
 
-        return True
+    def __str__(self) -> str:
+        return f'{self.symbol}{self.generics}'
 
     def fullname(self) -> str:
         return self.symbol.fullname()
 
     def resolve(self, res: Resolution) -> 'EnumerationType':
-        gens = self.generics.resolve(res)
-        return EnumerationType(
-            self.symbol,
-            gens,
-            [v.resolve(res) for v in self.variants]
-        )
+        return EnumerationType(self.symbol, self.generics.resolve(res))
+
+
+def generics_key(gens: Sequence['symbols.Generic'],
+                 args: Generics = None) -> Hashable:
+    # unresolved generics print and iterate differently from resolved ones,
+    # so they are kept apart even when the arguments are the same
+    if args is None:
+        return (len(gens) == 0,) + tuple(Generic(g) for g in gens)
+
+    return (args._resolved,) + tuple(args.args)
 
 
 def deref(tp: Type) -> Type:
@@ -635,6 +721,37 @@ def remove_ref(tp: Type) -> Type:
     return tp
 
 
+def head(tp: Type) -> Hashable:
+    # outermost constructor of a type; generics can stand for any type, and
+    # have no head
+    if isinstance(tp, (StructType, EnumerationType)):
+        return tp.symbol
+
+    if isinstance(tp, Generic):
+        return None
+
+    return type(tp)
+
+
+def accepted_heads(arg: Type) -> Set[Hashable]:
+    # heads of the parameter types that can accept an argument (see
+    # Resolution.accept_type), or None if any parameter type can
+    if isinstance(arg, Special):
+        return None
+
+    # types are interned, so this only needs to be computed once per type
+    if arg._accepted is None:
+        heads = {None, head(arg)}
+
+        # references are reduced automatically by one level
+        if isinstance(arg, Reference):
+            heads.add(head(arg.type))
+
+        arg._accepted = heads
+
+    return arg._accepted
+
+
 def resolve_overload(overloads: Set[Match],
                      args: Sequence[Type],
                      ret: Type) -> Set[Match]:
@@ -0,0 +1,56 @@
+from typing import Any, Callable, Dict, List, Tuple, TypeVar
+
+TFn = TypeVar('TFn', bound=Callable[..., Any])
+Handlers = Dict[type, Callable[..., Any]]
+
+
+def on(table: str, *tps: type) -> Callable[[TFn], TFn]:
+    # marks a method as the handler of nodes of the given types in the
+    # dispatch table named `table`
+    def register(fn: TFn) -> TFn:
+        visits: List[Tuple[str, Tuple[type, ...]]] = \
+            fn.__dict__.setdefault('_visits', [])
+        visits.append((table, tps))
+        return fn
+
+    return register
+
+
+class Visitor:
+    # dispatch tables, mapping node types to handlers; built once per class
+    # from the marked methods, on top of the tables of the base class
+    _tables: Dict[str, Handlers] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)  # type: ignore
+
+        tables = {name: dict(handlers)
+                  for name, handlers in cls._tables.items()}
+
+        for attr in vars(cls).values():
+            for table, tps in getattr(attr, '_visits', ()):
+                handlers = tables.setdefault(table, {})
+                for tp in tps:
+                    handlers[tp] = attr
+
+        cls._tables = tables
+
+    def visit(self, table: str, node: Any, *args: Any) -> Any:
+        handlers = self._tables[table]
+        handler = handlers.get(type(node))
+        if handler is None:
+            handler = _lookup(handlers, table, node)
+
+        return handler(self, node, *args)
+
+
+def _lookup(handlers: Handlers, table: str, node: Any) -> Callable[..., Any]:
+    # fall back to the handler of the closest base class, and remember it so
+    # that the next node of the same type is dispatched directly
+    tp = type(node)
+    for base in tp.__mro__[1:]:
+        if base in handlers:
+            handlers[tp] = handlers[base]
+            return handlers[tp]
+
+    assert False, f'unknown {table} node type {node}'
@@ -2,7 +2,8 @@
 
 from typing import List
 import heapq
-import os
+from pathlib import Path
+from finc import cache
 
 HEADER = """# Fin Instruction Set"""
 
@@ -73,15 +74,20 @@ class Allocator:
 
 
 def load() -> List[Instr]:
-    loc = os.path.dirname(os.path.realpath(__file__))
-    source = os.path.join(loc, 'instructions')
+    source = Path(__file__).resolve().parent / 'instructions'
 
+    # pickled instructions refer to this module by name, which differs when
+    # running as a script
+    return cache.load(f'instrs-{__name__}', source, lambda: build(source))
+
+
+def build(source: Path) -> List[Instr]:
     # available enum values
     alloc = Allocator(256)
     instrs = []
 
     instr: Instr = None
-    with open(source) as f:
+    with source.open() as f:
         for line in f:
             # empty line
             if line == '\n':